@@ -0,0 +1,134 @@
+import os
+import time
+import errno
+import uuid
+import shutil
+import hashlib
+from pathlib import Path, PurePosixPath
+from app.task_queue import DATA_DIR
+
+ATTACHMENT_DIR = DATA_DIR / "attachments"
+MAX_STORE_BYTES = int(os.getenv("ATTACHMENT_STORE_MAX_BYTES", str(1024 * 1024 * 1024)))
+MAX_BLOB_AGE = float(os.getenv("ATTACHMENT_STORE_MAX_AGE", str(7 * 24 * 3600)))
+EVICT_INTERVAL = 300.0
+
+class _HashingWriter:
+    """File wrapper that SHA-256 hashes everything written through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+class AttachmentStore:
+    """Content-addressed attachment storage with per-task workspaces
+
+    Blobs live once under ``blobs/<sha256[:2]>/<sha256>`` and are hard-linked
+    into each task's private workspace under their original name, so tasks
+    never see each other's files and identical uploads share disk space.
+    """
+
+    def __init__(self, root=ATTACHMENT_DIR, max_bytes=MAX_STORE_BYTES, max_age=MAX_BLOB_AGE):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.blobs_dir = self.root / "blobs"
+        self.workspaces_dir = self.root / "workspaces"
+        self.tmp_dir = self.root / "tmp"
+        for directory in (self.blobs_dir, self.workspaces_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self._last_evict = 0.0
+
+    def create_workspace(self, label="task"):
+        """Create an empty private directory for one task run"""
+        safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(label))[:64]
+        workspace = self.workspaces_dir / f"{safe_label}-{uuid.uuid4().hex[:12]}"
+        workspace.mkdir(parents=True)
+        return workspace
+
+    def release_workspace(self, workspace):
+        """Delete a task's workspace; blobs stay for reuse until evicted"""
+        shutil.rmtree(workspace, ignore_errors=True)
+        self.maybe_evict()
+
+    def ingest(self, workspace, name, write_content):
+        """Store content produced by ``write_content(f)`` and link it into the workspace
+
+        ``write_content`` receives a writable binary file and returns the
+        number of bytes written. Returns ``(path, sha256, size)``.
+        """
+        target = workspace / self._safe_relative_path(name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        try:
+            with open(tmp_path, "wb") as f:
+                writer = _HashingWriter(f)
+                size = write_content(writer)
+            sha256 = writer.digest.hexdigest()
+
+            blob_path = self.blobs_dir / sha256[:2] / sha256
+            blob_path.parent.mkdir(exist_ok=True)
+            if blob_path.exists():
+                # Already stored: keep the existing blob and mark it recently used
+                os.utime(blob_path)
+            else:
+                os.replace(tmp_path, blob_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        # Link under a fresh name, then swap it in: an existing file at the target
+        # (e.g. a repeated attachment name) may itself be a link to another blob,
+        # so it is replaced, never written through
+        staged = target.with_name(f".{target.name}.{uuid.uuid4().hex}")
+        try:
+            try:
+                os.link(blob_path, staged)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Workspace on another filesystem: a private copy is safe to hand out
+                shutil.copyfile(blob_path, staged)
+            os.replace(staged, target)
+        finally:
+            staged.unlink(missing_ok=True)
+        return target, sha256, size
+
+    @staticmethod
+    def _safe_relative_path(name):
+        """Keep attachment names inside the workspace"""
+        parts = [part for part in PurePosixPath(str(name).replace("\\", "/")).parts if part not in ("", ".", "..", "/")]
+        return Path(*parts) if parts else Path("file")
+
+    def maybe_evict(self):
+        """Run eviction at most once per EVICT_INTERVAL"""
+        now = time.time()
+        if now - self._last_evict >= EVICT_INTERVAL:
+            self._last_evict = now
+            self.evict()
+
+    def evict(self):
+        """Drop blobs older than max_age, then the least recently used until under max_bytes"""
+        now = time.time()
+        entries = []
+        for blob_path in self.blobs_dir.glob("*/*"):
+            try:
+                stat = blob_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, blob_path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, blob_path in entries:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            blob_path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"🧹 Evicted {removed} attachment blob(s), store now {total} bytes")
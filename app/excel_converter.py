@@ -0,0 +1,56 @@
+import re
+import csv
+from pathlib import Path
+
+def excel_to_csv_files(excel_path, csv_name):
+    """Convert every sheet of a workbook to CSV files next to it
+
+    Rows are streamed from openpyxl's read-only reader straight into the CSV
+    writer, so memory use doesn't grow with the row count. The first sheet is
+    written to ``csv_name``; further sheets to ``<stem>-<sheet>.csv``.
+    Returns a list of ``(csv_name, Path)`` pairs.
+    """
+    excel_path = Path(excel_path)
+    if excel_path.suffix.lower() == ".xls":
+        return _legacy_excel_to_csv(excel_path, csv_name)
+
+    # Imported lazily: only Analyze-style tasks pay for it
+    from openpyxl import load_workbook
+
+    stem = csv_name[:-len(".csv")] if csv_name.endswith(".csv") else csv_name
+    outputs = []
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        for index, sheet in enumerate(workbook.worksheets):
+            name = csv_name if index == 0 else f"{stem}-{_safe_sheet_name(sheet.title)}.csv"
+            out_path = excel_path.parent / f".{Path(name).name}.{index}.csv"
+            _unlink_existing(out_path)
+            with open(out_path, "w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                rows = 0
+                for row in sheet.iter_rows(values_only=True):
+                    if all(value is None for value in row):
+                        continue
+                    writer.writerow(["" if value is None else value for value in row])
+                    rows += 1
+            outputs.append((name, out_path))
+            print(f"  ✅ Converted sheet '{sheet.title}' to {name} ({rows} rows)")
+    finally:
+        workbook.close()
+    return outputs
+
+def _legacy_excel_to_csv(excel_path, csv_name):
+    """.xls isn't supported by openpyxl; fall back to pandas for the first sheet"""
+    import pandas as pd
+
+    out_path = excel_path.parent / f".{Path(csv_name).name}.0.csv"
+    _unlink_existing(out_path)
+    pd.read_excel(excel_path).to_csv(out_path, index=False)
+    return [(csv_name, out_path)]
+
+def _unlink_existing(path):
+    """Workspace files may be hard links into the attachment store; never write through one"""
+    path.unlink(missing_ok=True)
+
+def _safe_sheet_name(title):
+    return re.sub(r"[^\w.-]+", "_", title).strip("_") or "sheet"
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from app.task_queue import DATA_DIR
+
+GENERATION_CACHE_DB = DATA_DIR / "generations.db"
+CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "500"))
+
+def generation_key(model_name, prompt_version, brief, checks, attachments, round_num):
+    """Hash everything that determines a generation's prompt"""
+    digests = sorted((att["name"], att.get("sha256") or "") for att in attachments or [])
+    material = json.dumps(
+        [model_name, prompt_version, brief.strip(), checks, digests, round_num],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class GenerationCache:
+    """Persistent cache of generated ``files`` dicts with TTL and LRU eviction"""
+
+    def __init__(self, db_path=GENERATION_CACHE_DB, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    key TEXT PRIMARY KEY,
+                    files TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_used ON generations (last_used_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        """Return the cached files dict, or None if missing or expired"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT files FROM generations WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE generations SET last_used_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, files):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO generations (key, files, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(files), now, now)
+            )
+            conn.execute("DELETE FROM generations WHERE created_at <= ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM generations WHERE key NOT IN "
+                "(SELECT key FROM generations ORDER BY last_used_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
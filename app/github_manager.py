@@ -1,15 +1,60 @@
 import os
+import time
+import asyncio
+import base64
+import hashlib
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from github import Github, Auth, GithubException
+from functools import cached_property
+from pathlib import Path
+from github import Github, Auth, GithubException, InputGitTreeElement
+from app.templating import render
+
+UPLOAD_WORKERS = int(os.getenv("GITHUB_UPLOAD_WORKERS", "8"))
+UPLOAD_MAX_RETRIES = 5
+# Longer rate-limit waits fail the upload instead of stalling the task
+RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "60"))
+TEXT_EXTENSIONS = ('.html', '.htm', '.js', '.mjs', '.css', '.json', '.svg', '.md', '.txt',
+                   '.py', '.csv', '.yml', '.yaml', '.xml')
+PAGES_WAIT_TIMEOUT = float(os.getenv("PAGES_WAIT_TIMEOUT", "120"))
+
+HASH_CHUNK_BYTES = 1024 * 1024
+# Placeholder that seeds an empty repository's first commit
+BOOTSTRAP_FILE = ".gitkeep"
+
+def git_blob_sha(content):
+    """Compute the git blob SHA-1 of text, binary or on-disk (Path) content"""
+    if isinstance(content, Path):
+        digest = hashlib.sha1(f"blob {content.stat().st_size}\0".encode("ascii"))
+        with open(content, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    header = f"blob {len(content)}\0".encode("ascii")
+    return hashlib.sha1(header + content).hexdigest()
 
 class GitHubManager:
-    def __init__(self, token, username):
+    def __init__(self, token, username, upload_workers=UPLOAD_WORKERS, http_client=None):
         self.token = token
         self.username = username
+        self.upload_workers = max(1, upload_workers)
+        # One upload pool per process, shared by every publisher, caps concurrent blob POSTs
+        self.upload_pool = ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix="blob-upload")
+        # Shared keep-alive client for the raw REST calls PyGithub doesn't cover
+        self.http = http_client or httpx.AsyncClient(timeout=30.0)
         auth = Auth.Token(token)
-        self.github = Github(auth=auth)
-        self.user = self.github.get_user()
+        # Size the HTTP pool to the upload pool so parallel blobs reuse connections
+        self.github = Github(auth=auth, pool_size=self.upload_workers)
+    
+    @cached_property
+    def user(self):
+        """Authenticated user, resolved once per manager"""
+        user = self.github.get_user()
+        print(f"👤 Authenticated as: {user.login}")
+        return user
     
     def create_repository(self, repo_name, description=""):
         """Create or get existing repository"""
@@ -27,40 +72,100 @@ class GitHubManager:
             print(f"📁 Created repository: {repo.full_name}")
             return repo
     
-    def commit_file(self, repo, file_path, content, message):
-        """Create or update a text file"""
-        try:
-            # Try to get existing file
+    def publish_tree(self, repo, files, message, branch="main"):
+        """Publish all files as a single commit using the Git Data API
+
+        ``files`` maps repository paths to ``str`` (text), ``bytes`` (binary)
+        or ``Path`` (file read at upload time) content. Returns the SHA of the
+        new commit.
+        """
+        publisher = self.start_publish(repo, branch)
+        publisher.add_all(files)
+        return publisher.commit(message)
+    
+    def start_publish(self, repo, branch="main"):
+        """Begin an incremental publish; see TreePublisher"""
+        return TreePublisher(self, repo, branch)
+    
+    def _create_blob(self, repo, content):
+        """Create a git blob for text, binary or on-disk content, backing off on rate limits"""
+        if isinstance(content, Path):
+            content = content.read_bytes()
+        if isinstance(content, bytes):
+            payload, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        else:
+            payload, encoding = content, "utf-8"
+        
+        delay = 1
+        for attempt in range(UPLOAD_MAX_RETRIES):
             try:
-                existing = repo.get_contents(file_path)
-                repo.update_file(file_path, message, content, existing.sha)
-                print(f"  ✅ Updated: {file_path}")
+                return repo.create_git_blob(payload, encoding)
             except GithubException as e:
-                if e.status == 404:
-                    repo.create_file(file_path, message, content)
-                    print(f"  ✅ Created: {file_path}")
-                else:
+                if not self._is_rate_limited(e) or attempt == UPLOAD_MAX_RETRIES - 1:
                     raise
-        except Exception as e:
-            print(f"  ❌ Failed to commit {file_path}: {e}")
+                wait = self._retry_after(e) or delay
+                if wait > RATE_LIMIT_MAX_WAIT:
+                    raise
+                print(f"  ⏳ Rate limited creating blob, retrying in {wait}s...")
+                time.sleep(wait)
+                delay *= 2
     
-    def commit_binary_file(self, repo, file_path, binary_data, message):
-        """Create or update a binary file"""
-        try:
+    @staticmethod
+    def _is_rate_limited(error):
+        """429, or a 403 that is a (secondary) rate limit rather than a permission error"""
+        if error.status == 429:
+            return True
+        if error.status != 403:
+            return False
+        headers = {k.lower(): v for k, v in (error.headers or {}).items()}
+        if "retry-after" in headers or headers.get("x-ratelimit-remaining") == "0":
+            return True
+        message = error.data.get("message", "") if isinstance(error.data, dict) else str(error.data or "")
+        return "rate limit" in message.lower()
+    
+    @staticmethod
+    def _retry_after(error):
+        """Seconds to wait according to a rate-limit response, if it says"""
+        headers = {k.lower(): v for k, v in (error.headers or {}).items()}
+        if "retry-after" in headers:
             try:
-                existing = repo.get_contents(file_path)
-                repo.update_file(file_path, message, binary_data, existing.sha)
-                print(f"  ✅ Updated binary: {file_path}")
-            except GithubException as e:
-                if e.status == 404:
-                    repo.create_file(file_path, message, binary_data)
-                    print(f"  ✅ Created binary: {file_path}")
-                else:
-                    raise
-        except Exception as e:
-            print(f"  ❌ Failed to commit binary {file_path}: {e}")
+                return max(1, int(headers["retry-after"]))
+            except ValueError:
+                return None
+        if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+            try:
+                return max(1, int(headers["x-ratelimit-reset"]) - int(time.time()))
+            except ValueError:
+                return None
+        return None
+    
+    def head_sha(self, repo, branch="main"):
+        """Return the SHA the branch ref points at, or None if it doesn't exist"""
+        try:
+            return repo.get_git_ref(f"heads/{branch}").object.sha
+        except GithubException as e:
+            # 404 = no such branch, 409 = repository is empty
+            if e.status in (404, 409):
+                return None
+            raise
+    
+    def _get_branch_head(self, repo, branch):
+        """Return the head commit of a branch, or None if the branch doesn't exist"""
+        sha = self.head_sha(repo, branch)
+        return repo.get_git_commit(sha) if sha else None
+    
+    def _bootstrap_branch(self, repo, branch):
+        """Create the first commit of an empty repository
+        
+        The Git Data API refuses to work on a repository without commits, so
+        seed it through the contents API first. The first publish removes the
+        placeholder file again.
+        """
+        repo.create_file(BOOTSTRAP_FILE, "Initial commit", "", branch=branch)
+        print(f"  ✅ Initialized branch: {branch}")
+        return self._get_branch_head(repo, branch)
     
-    def enable_pages(self, repo_name, branch="main"):
+    async def enable_pages(self, repo_name, branch="main"):
         """Enable GitHub Pages"""
         url = f"https://api.github.com/repos/{self.username}/{repo_name}/pages"
         headers = {
@@ -70,7 +175,7 @@ class GitHubManager:
         data = {"source": {"branch": branch, "path": "/"}}
         
         try:
-            response = httpx.post(url, headers=headers, json=data, timeout=30.0)
+            response = await self.http.post(url, headers=headers, json=data)
             if response.status_code in (201, 204, 409):  # 409 = already enabled
                 print(f"  ✅ GitHub Pages enabled")
                 return True
@@ -81,28 +186,163 @@ class GitHubManager:
             print(f"  ❌ Failed to enable Pages: {e}")
             return False
     
+    async def wait_for_pages(self, repo, commit_sha, timeout=PAGES_WAIT_TIMEOUT):
+        """Poll the latest Pages build until it is built for commit_sha
+        
+        Returns True once deployed, False on a failed build or timeout.
+        """
+        url = f"https://api.github.com/repos/{repo.full_name}/pages/builds/latest"
+        headers = {
+            "Authorization": f"token {self.token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 1.0
+        
+        while True:
+            try:
+                response = await self.http.get(url, headers=headers)
+                if response.status_code == 200:
+                    build = response.json()
+                    status = build.get("status")
+                    if build.get("commit") == commit_sha:
+                        if status == "built":
+                            print(f"  ✅ Pages built for {commit_sha[:7]}")
+                            return True
+                        if status == "errored":
+                            print(f"  ❌ Pages build failed: {build.get('error', {}).get('message')}")
+                            return False
+            except Exception as e:
+                print(f"  ⚠️ Pages status check failed: {e}")
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                print(f"  ⚠️ Pages not built after {timeout:.0f}s, continuing")
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, 10.0)
+    
     def generate_mit_license(self):
         """Generate MIT LICENSE text"""
         year = datetime.utcnow().year
-        return f"""MIT License
+        return render("LICENSE", year=year, username=self.username)
 
-Copyright (c) {year} {self.username}
 
-Permission is hereby granted, free of charge, to any person obtaining a copy
-of this software and associated documentation files (the "Software"), to deal
-in the Software without restriction, including without limitation the rights
-to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-copies of the Software, and to permit persons to whom the Software is
-furnished to do so, subject to the following conditions:
+class TreePublisher:
+    """Stage files for a single commit while their blobs upload in the background
 
-The above copyright notice and this permission notice shall be included in all
-copies or substantial portions of the Software.
-
-THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
-SOFTWARE.
-"""
+    ``add()`` can be called as soon as each file is known (e.g. while the LLM
+    is still streaming), and ``commit()`` waits for the uploads, then writes
+    one tree and one commit. Files identical to the branch's current tree are
+    never uploaded.
+    """
+    
+    def __init__(self, manager, repo, branch="main"):
+        self.manager = manager
+        self.repo = repo
+        self.branch = branch
+        self.parent = manager._get_branch_head(repo, branch)
+        if self.parent is None:
+            self.parent = manager._bootstrap_branch(repo, branch)
+        
+        # Only upload files whose content differs from the current tree
+        self.base_tree = repo.get_git_tree(self.parent.tree.sha, recursive=True)
+        blobs = [] if self.base_tree.raw_data.get("truncated") else [
+            element for element in self.base_tree.tree if element.type == "blob"
+        ]
+        self.existing = {element.path: element.sha for element in blobs}
+        self.existing_sizes = {element.path: element.size for element in blobs}
+        # This publisher's uploads on the manager's shared pool
+        self._futures = []
+        # path -> (local blob SHA, upload future or None when unchanged)
+        self._staged = {}
+        self._deleted = set()
+        # Drop the bootstrap placeholder (also after an earlier publish to it failed)
+        if set(self.existing) == {BOOTSTRAP_FILE}:
+            self._deleted.add(BOOTSTRAP_FILE)
+    
+    def read_text_files(self, max_files=50, max_bytes=200 * 1024):
+        """Fetch the current tree's text files concurrently; returns {path: text}"""
+        paths = sorted(
+            (path for path in self.existing
+             if path.lower().endswith(TEXT_EXTENSIONS) and (self.existing_sizes.get(path) or 0) <= max_bytes),
+            key=lambda path: self.existing_sizes.get(path) or 0
+        )[:max_files]
+        futures = {path: self._submit(self.repo.get_git_blob, self.existing[path]) for path in paths}
+        files = {}
+        for path, future in futures.items():
+            try:
+                files[path] = base64.b64decode(future.result().content).decode("utf-8")
+            except (GithubException, UnicodeDecodeError, ValueError) as e:
+                print(f"  ⚠️ Could not read {path}: {e}")
+        return files
+    
+    def add(self, file_path, content):
+        """Stage a file, starting its upload if its content changed"""
+        local_sha = git_blob_sha(content)
+        self._deleted.discard(file_path)
+        staged = self._staged.get(file_path)
+        if staged and staged[0] == local_sha:
+            return
+        if self.existing.get(file_path) == local_sha:
+            self._staged[file_path] = (local_sha, None)
+        else:
+            self._staged[file_path] = (local_sha, self._submit(self.manager._create_blob, self.repo, content))
+    
+    def delete(self, file_path):
+        """Remove a file from the branch in the commit"""
+        if file_path in self.existing:
+            self._staged.pop(file_path, None)
+            self._deleted.add(file_path)
+    
+    def add_all(self, files):
+        """Stage many files; one bad entry is reported and left out, not fatal"""
+        for file_path, content in files.items():
+            try:
+                self.add(file_path, content)
+            except Exception as e:
+                print(f"  ❌ Failed to stage {file_path}: {e}")
+    
+    def commit(self, message, paths=None):
+        """Commit the staged files (only ``paths`` if given); returns the commit SHA"""
+        try:
+            if paths is not None:
+                paths = set(paths)
+            staged = {
+                file_path: entry for file_path, entry in self._staged.items()
+                if paths is None or file_path in paths
+            }
+            changed = {file_path: future for file_path, (_, future) in staged.items() if future is not None}
+            if not changed and not self._deleted:
+                print(f"  ⏭️  No changes in {len(staged)} files, skipping commit")
+                return self.parent.sha
+            print(f"  📦 {len(changed)} of {len(staged)} files changed, {len(self._deleted)} deleted")
+            
+            elements = [
+                InputGitTreeElement(file_path, "100644", "blob", sha=future.result().sha)
+                for file_path, future in changed.items()
+            ]
+            # A null SHA removes the path from the tree
+            elements += [
+                InputGitTreeElement(file_path, "100644", "blob", sha=None)
+                for file_path in sorted(self._deleted)
+            ]
+            tree = self.repo.create_git_tree(elements, self.base_tree)
+            commit = self.repo.create_git_commit(message, tree, [self.parent])
+            self.repo.get_git_ref(f"heads/{self.branch}").edit(commit.sha)
+            print(f"  ✅ Published {len(changed)} files in commit {commit.sha[:7]}")
+            return commit.sha
+        finally:
+            self.close()
+    
+    def _submit(self, fn, *args):
+        future = self.manager.upload_pool.submit(fn, *args)
+        self._futures.append(future)
+        return future
+    
+    def close(self):
+        """Cancel this publisher's pending uploads; the shared pool keeps running"""
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
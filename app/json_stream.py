@@ -0,0 +1,221 @@
+import json
+import re
+from collections import deque
+
+_STRUCTURAL = re.compile(r'[{}\[\]:,"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+class IncrementalFilesParser:
+    """Incrementally parse a streamed ``{"files": {path: content}}`` response
+
+    Also accepts the schema-constrained form ``{"files": [{"path": ...,
+    "content": ...}]}``. ``feed()`` takes the next chunk of model output and
+    returns the ``(path, content)`` pairs completed by it, so files can be
+    used while the model is still writing the rest. Any text
+    before the first ``{`` (e.g. a markdown fence) is ignored. Scanning is
+    linear in the total input size.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.files = {}
+        self._pos = 0
+        self._started = False
+        # One frame per open container: [kind, key, expecting_key, string fields]
+        self._stack = []
+        # Start of the string being scanned and how far the scan got
+        self._string_start = None
+        self._string_scan = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        text = self.text
+
+        if not self._started:
+            start = text.find("{", self._pos)
+            if start < 0:
+                self._pos = len(text)
+                return completed
+            self._started = True
+            self._pos = start
+
+        while True:
+            if self._string_start is not None:
+                end = self._scan_string(text)
+                if end is None:
+                    break
+                token = text[self._string_start:end]
+                self._string_start = None
+                self._pos = end
+                self._on_string(token, completed)
+                continue
+
+            match = _STRUCTURAL.search(text, self._pos)
+            if match is None:
+                self._pos = len(text)
+                break
+            char = match.group()
+            self._pos = match.end()
+
+            if char == '"':
+                self._string_start = match.start()
+                self._string_scan = match.end()
+            elif char in "{[":
+                self._stack.append(["obj" if char == "{" else "arr", None, char == "{", {}])
+            elif char in "}]":
+                if self._stack:
+                    if self._in_files_array_entry():
+                        self._on_entry(self._stack[-1][3], completed)
+                    self._stack.pop()
+            elif char == ",":
+                if self._stack and self._stack[-1][0] == "obj":
+                    self._stack[-1][2] = True
+            # ":" needs no handling: a key is always followed by its value
+
+        return completed
+
+    def _scan_string(self, text):
+        """Return the index just past the closing quote, or None if not yet streamed"""
+        i = self._string_scan
+        while True:
+            match = _STRING_SPECIAL.search(text, i)
+            if match is None:
+                self._string_scan = len(text)
+                return None
+            if match.group() == "\\":
+                if match.end() >= len(text):
+                    # Escape split across chunks; resume at the backslash
+                    self._string_scan = match.start()
+                    return None
+                i = match.end() + 1
+            else:
+                return match.end()
+
+    def _on_string(self, token, completed):
+        if not self._stack or self._stack[-1][0] != "obj":
+            return
+        frame = self._stack[-1]
+        if frame[2]:
+            frame[1] = json.loads(token)
+            frame[2] = False
+        elif self._in_files_object():
+            self._on_entry({"path": frame[1], "content": json.loads(token)}, completed)
+        elif self._in_files_array_entry():
+            frame[3][frame[1]] = json.loads(token)
+
+    def _on_entry(self, entry, completed):
+        path, content = entry.get("path"), entry.get("content")
+        if isinstance(path, str) and isinstance(content, str):
+            self.files[path] = content
+            completed.append((path, content))
+
+    def _in_files_object(self):
+        return (
+            len(self._stack) == 2
+            and self._stack[0][0] == "obj"
+            and self._stack[0][1] == "files"
+            and self._stack[1][0] == "obj"
+        )
+
+    def _in_files_array_entry(self):
+        return (
+            len(self._stack) == 3
+            and self._stack[0][0] == "obj"
+            and self._stack[0][1] == "files"
+            and self._stack[1][0] == "arr"
+            and self._stack[2][0] == "obj"
+        )
+
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_DECODER = json.JSONDecoder()
+_CLOSERS = {"{": "}", "[": "]"}
+MAX_REPAIR_ATTEMPTS = 5
+
+def extract_json_object(text, repair=True):
+    """Find the outermost valid JSON object in free-form model output
+
+    Scans once, skipping over string literals, so braces inside content never
+    confuse it. Returns the first complete top-level object that parses
+    (preferring one with a ``files`` key), or repairs a truncated trailing
+    object by cutting back to its last complete value and closing it
+    (unless ``repair`` is false). Returns None if nothing usable is found.
+    """
+    # Fast path: well-formed output (possibly fenced) decodes at its first brace
+    first_brace = text.find("{")
+    if first_brace < 0:
+        return None
+    try:
+        data, _ = _DECODER.raw_decode(text, first_brace)
+        if isinstance(data, dict) and "files" in data:
+            return data
+    except json.JSONDecodeError:
+        pass
+
+    first_valid = None
+    start = None
+    stack = []
+    # (cut position, closers) after the latest complete values inside the current object
+    safe_points = deque(maxlen=MAX_REPAIR_ATTEMPTS)
+    pos = 0
+
+    while True:
+        match = _STRUCTURAL.search(text, pos)
+        if match is None:
+            break
+        char = match.group()
+        pos = match.end()
+
+        if char == '"':
+            string = _STRING.match(text, match.start())
+            if string is None:
+                # Unterminated string: the output was cut off here
+                pos = len(text)
+                break
+            pos = string.end()
+            continue
+
+        if start is None:
+            if char == "{":
+                start = match.start()
+                stack = ["{"]
+                safe_points.clear()
+            continue
+
+        if char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            stack.pop()
+            if not stack:
+                try:
+                    data = json.loads(text[start:pos])
+                except json.JSONDecodeError:
+                    data = None
+                if isinstance(data, dict):
+                    if "files" in data:
+                        return data
+                    if first_valid is None:
+                        first_valid = data
+                start = None
+                continue
+            safe_points.append((pos, "".join(_CLOSERS[c] for c in reversed(stack))))
+        elif char == ",":
+            safe_points.append((match.start(), "".join(_CLOSERS[c] for c in reversed(stack))))
+
+    if first_valid is not None:
+        return first_valid
+    if start is None or not repair:
+        return None
+    return _repair_truncated(text, start, safe_points)
+
+def _repair_truncated(text, start, safe_points):
+    """Close a truncated object at its latest cut point that yields valid JSON"""
+    for cut, closers in reversed(safe_points):
+        try:
+            data = json.loads(text[start:cut] + closers)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            print(f"⚠️ Repaired truncated JSON ({len(text) - cut} trailing chars dropped)")
+            return data
+    return None
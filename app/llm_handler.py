@@ -1,51 +1,161 @@
-import json
+import os
 import re
+import json
+import asyncio
 import google.generativeai as genai
+from app.excel_converter import excel_to_csv_files
+from app.generation_cache import generation_key
+from app.model_router import ModelRouter
+from app.json_stream import IncrementalFilesParser, extract_json_object
+from app.prompt_builder import build_attachment_context, estimate_tokens
+from app.templating import render, html_list_items
+
+# Bump whenever the prompt template changes so cached generations are not reused
+PROMPT_VERSION = 4
+STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+# Planned generation: "auto" (for briefs naming many files), "always" or "never"
+PLANNED_GENERATION = os.getenv("LLM_PLANNED_GENERATION", "auto").lower()
+PLAN_MIN_FILES = int(os.getenv("LLM_PLAN_MIN_FILES", "6"))
+FILE_CONCURRENCY = int(os.getenv("LLM_FILE_CONCURRENCY", "4"))
+REVISION_MODE = os.getenv("LLM_REVISION_MODE", "true").lower() in ("1", "true", "yes")
+REVISION_TOKEN_BUDGET = int(os.getenv("LLM_REVISION_TOKEN_BUDGET", "30000"))
+
+FILENAME_PATTERN = re.compile(
+    r"[\w./-]+\.(?:html?|js|mjs|css|json|svg|md|txt|py|csv|ya?ml|xml|ts|jsx|tsx)\b",
+    re.IGNORECASE
+)
+CODE_FENCE = re.compile(r"^```[\w+-]*\n(.*?)\n?```\s*$", re.DOTALL)
+
+# Gemini schemas can't express arbitrary object keys, so files come back as a list
+FILES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "content": {"type": "string"}
+                },
+                "required": ["path", "content"]
+            }
+        }
+    },
+    "required": ["files"]
+}
+
+PROSE_OUTPUT_FORMAT = """Return your response as a JSON object with this structure:
+{
+  "files": {
+    "filename1.ext": "content of file 1",
+    "filename2.ext": "content of file 2",
+    ...
+  }
+}"""
+
+STRUCTURED_OUTPUT_FORMAT = """Return a JSON object whose "files" array has one entry per file:
+- "path": the exact filename
+- "content": the complete file content"""
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "files": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "purpose": {"type": "string"}
+                },
+                "required": ["path", "purpose"]
+            }
+        }
+    },
+    "required": ["files"]
+}
+
+REVISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "changed": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string"},
+                    "content": {"type": "string"}
+                },
+                "required": ["path", "content"]
+            }
+        },
+        "deleted": {
+            "type": "array",
+            "items": {"type": "string"}
+        }
+    },
+    "required": ["changed", "deleted"]
+}
 
 class LLMHandler:
-    def __init__(self, api_key):
+    def __init__(self, api_key, cache=None, structured_output=STRUCTURED_OUTPUT, model_names=None):
         self.api_key = api_key
+        self.cache = cache
+        self.structured_output = structured_output
+        self.generation_config = None
         if api_key:
             genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            # Routes each call across the configured models; same call API as GenerativeModel
+            self.model = ModelRouter(model_names)
+            self.model_name = ",".join(self.model.model_names)
+            if structured_output:
+                self.generation_config = genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    response_schema=FILES_SCHEMA
+                )
             print("✅ Gemini API configured")
         else:
             self.model = None
+            self.model_name = None
             print("⚠️ No Gemini API key")
     
-    def generate_files(self, brief, checks, attachments, round_num=1):
-        """Generate all required files based on the brief"""
-        
-        # Detect task type and use specialized handler
-        if self._is_analyze_task(brief, attachments):
-            return self._handle_analyze_task(brief, checks, attachments)
-        
-        # Build context about attachments
-        att_context = ""
-        if attachments:
-            att_context = "\n\nAttachments provided:\n"
-            for att in attachments:
-                att_context += f"- {att['name']} ({att['mime']}, {len(att['data'])} bytes)\n"
-                # For text files, include preview
-                if att['mime'].startswith('text') or att['name'].endswith(('.txt', '.csv', '.json', '.md', '.py')):
-                    try:
-                        with open(att['path'], 'r', encoding='utf-8', errors='ignore') as f:
-                            preview = f.read(500)
-                            att_context += f"  Preview: {preview[:200]}...\n"
-                    except:
-                        pass
+    async def generate_files(self, brief, checks, attachments, round_num=1, bypass_cache=False, on_file=None,
+                             finalize=None):
+        """Generate all required files based on the brief
+        
+        If ``on_file(path, content)`` is given, the response is streamed and the
+        callback fires as each file completes, before the full response is in.
+        The returned dict is authoritative and may differ (e.g. on fallback).
+        
+        ``finalize(files)`` (validation and repair) returns ``(files, clean)``
+        and runs before caching; only clean, complete generations are cached,
+        so cache hits are returned as they are.
+        """
+        
+        # Deterministic task families skip the LLM (blocking file IO, run in a thread)
+        handler = classify_task(brief, checks, attachments)
+        if handler:
+            files = await asyncio.to_thread(handler.handle, brief, checks, attachments)
+            return (await self._finalize(files, finalize))[0]
+        
+        # Reuse an earlier generation for identical inputs
+        cache_key = None
+        if self.cache and self.model:
+            cache_key = generation_key(self.model_name, PROMPT_VERSION, brief, checks, attachments, round_num)
+            if not bypass_cache:
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+                if cached:
+                    print(f"⚡ Using cached generation ({len(cached)} files)")
+                    return cached
+        
+        # Task description shared by the single-call and planned prompts
+        context = await self._task_context(brief, checks, attachments, round_num)
         
         # Build the prompt
         prompt = f"""You are an expert web developer. Generate a complete, working web application based on the following requirements.
 
-TASK BRIEF:
-{brief}
-
-ROUND: {round_num}
-{att_context}
-
-EVALUATION CHECKS:
-{json.dumps(checks, indent=2)}
+{context}
 
 CRITICAL INSTRUCTIONS:
 1. Read the brief VERY CAREFULLY and identify ALL files that need to be created
@@ -61,14 +171,7 @@ CRITICAL INSTRUCTIONS:
 11. Always create a professional README.md explaining the project
 
 OUTPUT FORMAT:
-Return your response as a JSON object with this structure:
-{{
-  "files": {{
-    "filename1.ext": "content of file 1",
-    "filename2.ext": "content of file 2",
-    ...
-  }}
-}}
+{STRUCTURED_OUTPUT_FORMAT if self.structured_output else PROSE_OUTPUT_FORMAT}
 
 IMPORTANT: 
 - The JSON must be valid and parseable
@@ -79,82 +182,530 @@ IMPORTANT:
 
 Generate the files now:"""
 
+        print(f"🧮 Prompt size: ~{estimate_tokens(prompt)} tokens")
+        
+        files, cacheable = await self._generate_with_model(brief, checks, attachments, context, prompt, on_file)
+        files, clean = await self._finalize(files, finalize)
+        if cache_key and cacheable and clean:
+            await asyncio.to_thread(self.cache.put, cache_key, files)
+        return files
+    
+    async def _finalize(self, files, finalize):
+        if finalize is None or not files:
+            return files, True
+        return await finalize(files)
+    
+    async def _generate_with_model(self, brief, checks, attachments, context, prompt, on_file):
+        """Planned or single-call generation; returns (files, cacheable)
+        
+        Fallback pages and responses that needed truncation repair are not
+        cacheable.
+        """
         try:
             if not self.model:
-                return self._generate_fallback(brief, checks, attachments)
+                return self._generate_fallback(brief, checks, attachments), False
             
-            print("🤖 Calling Gemini API...")
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
+            files = None
+            response_text = None
+            if self._should_plan(brief):
+                files = await self._generate_planned(context, on_file)
+                if not files:
+                    print("⚠️ Planned generation failed, falling back to a single call")
             
-            # Try to extract JSON from response
-            files = self._parse_llm_response(response_text)
+            if not files:
+                print("🤖 Calling Gemini API...")
+                files, response_text = await self._request_files(prompt, on_file)
+            
+            if not files:
+                # One repair attempt that tells the model what went wrong
+                error = self._describe_parse_error(response_text)
+                print(f"⚠️ LLM response didn't parse ({error}), retrying once")
+                repair_prompt = (
+                    f"{prompt}\n\nYour previous response could not be used: {error}\n"
+                    "Return the complete response again as valid JSON in the required format."
+                )
+                files, response_text = await self._request_files(repair_prompt, on_file)
             
             if not files:
                 print("⚠️ LLM didn't return valid JSON, using fallback")
-                return self._generate_fallback(brief, checks, attachments)
+                return self._generate_fallback(brief, checks, attachments), False
             
             print(f"✅ Generated {len(files)} files")
             for filename in files.keys():
                 print(f"  - {filename}")
             
-            return files
+            # Truncated output that only parsed after repair isn't worth reusing
+            complete = response_text is None or extract_json_object(response_text, repair=False) is not None
+            return files, complete
             
         except Exception as e:
             print(f"❌ LLM generation failed: {e}")
-            return self._generate_fallback(brief, checks, attachments)
+            return self._generate_fallback(brief, checks, attachments), False
+    
+    async def _task_context(self, brief, checks, attachments, round_num):
+        """Brief, attachment summaries (within the token budget) and checks"""
+        att_context = await asyncio.to_thread(build_attachment_context, attachments)
+        return f"""TASK BRIEF:
+{brief}
+
+ROUND: {round_num}
+{att_context}
+
+EVALUATION CHECKS:
+{json.dumps(checks, indent=2)}"""
+    
+    async def repair_files(self, brief, checks, attachments, round_num, files, problems):
+        """Regenerate just the files that failed local validation
+        
+        ``problems`` maps each failing path to its validation errors. Returns
+        ``{path: content}`` for the files that were regenerated.
+        """
+        if not self.model:
+            return {}
+        context = await self._task_context(brief, checks, attachments, round_num)
+        manifest_text = "\n".join(f"- {file_path}" for file_path in files)
+        slots = asyncio.Semaphore(FILE_CONCURRENCY)
+        
+        async def repair_one(file_path):
+            issues = "\n".join(f"- {issue}" for issue in problems[file_path])
+            entry = {
+                "path": file_path,
+                "purpose": f"Replace the previous version, fixing these validation errors:\n{issues}\n\n"
+                           f"Previous version:\n{files[file_path]}"
+            }
+            async with slots:
+                return file_path, await self._generate_single_file(context, manifest_text, entry)
+        
+        results = await asyncio.gather(*(
+            repair_one(file_path) for file_path in problems if isinstance(files.get(file_path), str)
+        ))
+        return {file_path: content for file_path, content in results if content is not None}
+    
+    async def revise_files(self, brief, checks, attachments, round_num, existing_files, on_file=None,
+                           finalize=None):
+        """Revise the previously deployed files instead of regenerating them
+        
+        The model sees the relevant existing files and returns only a patch set
+        of changed/added and deleted paths. Returns ``(files, deleted)`` where
+        ``files`` is the full revised set. Falls back to generate_files when
+        there is nothing to revise or the patch can't be parsed. ``finalize``
+        is as for generate_files.
+        """
+        if (not REVISION_MODE or not self.model or not existing_files
+                or classify_task(brief, checks, attachments)):
+            files = await self.generate_files(
+                brief, checks, attachments, round_num, on_file=on_file, finalize=finalize
+            )
+            return files, []
+        
+        att_context = await asyncio.to_thread(build_attachment_context, attachments)
+        sent, listed = self._select_existing_files(brief, checks, existing_files)
+        existing_context = "".join(
+            f"\n--- {file_path} ---\n{existing_files[file_path]}\n" for file_path in sent
+        )
+        if listed:
+            existing_context += "\nOther existing files (not shown, keep unless they must change):\n"
+            existing_context += "".join(f"- {file_path}\n" for file_path in listed)
+        
+        prompt = f"""You are an expert web developer revising an existing web application for a new round of requirements.
+
+TASK BRIEF:
+{brief}
+
+ROUND: {round_num}
+{att_context}
+
+EVALUATION CHECKS:
+{json.dumps(checks, indent=2)}
+
+CURRENT FILES:
+{existing_context}
+
+INSTRUCTIONS:
+1. Change only what the brief and checks require; keep everything else working
+2. Return the COMPLETE new content of every file you change or add - no diffs, no placeholders
+3. Use the EXACT filenames and element IDs the brief mentions
+4. List files that must be removed in "deleted"; omit unchanged files entirely
+5. Update README.md if the behaviour of the application changes
+
+OUTPUT FORMAT:
+Return a JSON object with "changed" (a list of {{"path", "content"}} entries) and
+"deleted" (a list of paths). Do NOT include markdown code blocks, just return raw JSON."""
+        
+        print(f"✏️ Revising {len(existing_files)} existing files (~{estimate_tokens(prompt)} prompt tokens)...")
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    response_schema=REVISION_SCHEMA
+                ) if self.structured_output else None
+            )
+            response_text = response.text.strip()
+            try:
+                patch = json.loads(response_text)
+            except json.JSONDecodeError:
+                patch = extract_json_object(response_text)
+            changed = {
+                entry["path"]: entry["content"] for entry in patch.get("changed", [])
+                if isinstance(entry, dict)
+                and isinstance(entry.get("path"), str)
+                and isinstance(entry.get("content"), str)
+            }
+            deleted = [
+                file_path for file_path in patch.get("deleted", [])
+                if file_path in existing_files and file_path not in changed
+            ]
+        except Exception as e:
+            print(f"⚠️ Revision failed ({e}), regenerating from scratch")
+            files = await self.generate_files(
+                brief, checks, attachments, round_num, on_file=on_file, finalize=finalize
+            )
+            return files, []
+        
+        print(f"✅ Revision: {len(changed)} changed, {len(deleted)} deleted, "
+              f"{len(existing_files) - len(changed) - len(deleted)} reused")
+        for file_path, content in changed.items():
+            print(f"  - {file_path}")
+            if on_file:
+                on_file(file_path, content)
+        
+        files = {file_path: content for file_path, content in existing_files.items() if file_path not in deleted}
+        files.update(changed)
+        files, _ = await self._finalize(files, finalize)
+        return files, deleted
+    
+    def _select_existing_files(self, brief, checks, existing_files):
+        """Choose which existing files to show the model within the revision budget
+        
+        Files named in the brief or checks come first, then index.html and
+        README.md, then the rest smallest first. Returns (sent, listed).
+        """
+        mentioned = " ".join([brief, *map(str, checks)]).lower()
+        
+        def priority(file_path):
+            name = file_path.lower()
+            if name in mentioned or name.rsplit("/", 1)[-1] in mentioned:
+                return 0
+            if name in ("index.html", "readme.md"):
+                return 1
+            return 2
+        
+        ordered = sorted(existing_files, key=lambda file_path: (priority(file_path), len(existing_files[file_path])))
+        sent, listed = [], []
+        remaining = REVISION_TOKEN_BUDGET
+        for file_path in ordered:
+            tokens = estimate_tokens(existing_files[file_path])
+            if tokens <= remaining:
+                sent.append(file_path)
+                remaining -= tokens
+            else:
+                listed.append(file_path)
+        return sent, listed
+    
+    def _should_plan(self, brief):
+        """Use planned generation when the brief asks for many files"""
+        if PLANNED_GENERATION == "always":
+            return True
+        if PLANNED_GENERATION != "auto":
+            return False
+        named = {name.lower() for name in FILENAME_PATTERN.findall(brief)}
+        return len(named) >= PLAN_MIN_FILES
+    
+    async def _generate_planned(self, context, on_file=None):
+        """Plan the file manifest, then generate each file concurrently"""
+        plan_prompt = f"""You are an expert web developer planning a web application.
+
+{context}
+
+List EVERY file the application needs, using the EXACT filenames from the brief.
+Always include index.html (linking to or displaying the other files) and README.md.
+For each file give its path and a one or two sentence purpose, including any
+element IDs, data formats or APIs it must use. Do not write file contents."""
+        
+        print("🗺️ Planning file manifest...")
+        try:
+            response = await self.model.generate_content_async(
+                plan_prompt,
+                generation_config=genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    response_schema=PLAN_SCHEMA
+                )
+            )
+            manifest = [
+                entry for entry in json.loads(response.text).get("files", [])
+                if isinstance(entry, dict) and entry.get("path")
+            ]
+        except Exception as e:
+            print(f"❌ Planning failed: {e}")
+            return None
+        if not manifest:
+            return None
+        print(f"🗺️ Planned {len(manifest)} files, generating up to {FILE_CONCURRENCY} at a time")
+        
+        manifest_text = "\n".join(f"- {entry['path']}: {entry.get('purpose', '')}" for entry in manifest)
+        slots = asyncio.Semaphore(FILE_CONCURRENCY)
+        
+        async def generate_one(entry):
+            async with slots:
+                content = await self._generate_single_file(context, manifest_text, entry)
+            if content is not None and on_file:
+                on_file(entry["path"], content)
+            return entry["path"], content
+        
+        results = await asyncio.gather(*(generate_one(entry) for entry in manifest))
+        files = {file_path: content for file_path, content in results if content is not None}
+        failed = [entry for entry in manifest if entry["path"] not in files]
+        if failed:
+            print(f"🔁 Retrying {len(failed)} failed file(s)")
+            results = await asyncio.gather(*(generate_one(entry) for entry in failed))
+            files.update((file_path, content) for file_path, content in results if content is not None)
+        
+        missing = [entry["path"] for entry in manifest if entry["path"] not in files]
+        if missing:
+            # A partial app would be published (and cached) with files missing
+            print(f"⚠️ Failed to generate: {', '.join(missing)}")
+            return None
+        return files
+    
+    async def _generate_single_file(self, context, manifest_text, entry):
+        """Generate the raw content of one planned file; None on failure"""
+        prompt = f"""You are an expert web developer building one file of a multi-file web application.
+
+{context}
+
+ALL FILES IN THE APPLICATION:
+{manifest_text}
+
+Write the COMPLETE content of `{entry['path']}`.
+Purpose: {entry.get('purpose', '')}
+
+Use the exact filenames above when referring to other files. No placeholders or TODOs.
+Output ONLY the raw file content - no explanations and no markdown code fences."""
+        
+        try:
+            response = await self.model.generate_content_async(prompt)
+            content = response.text
+        except Exception as e:
+            print(f"  ❌ {entry['path']}: {e}")
+            return None
+        
+        # Models sometimes fence the file anyway
+        fenced = CODE_FENCE.match(content.strip())
+        if fenced:
+            content = fenced.group(1)
+        print(f"  ✅ Generated: {entry['path']}")
+        return content
+    
+    async def _request_files(self, prompt, on_file=None):
+        """Run one generation; returns (files or None, raw response text)"""
+        if on_file:
+            response_text = await self._generate_streaming(prompt, on_file)
+        else:
+            response = await self.model.generate_content_async(
+                prompt, generation_config=self.generation_config
+            )
+            response_text = response.text.strip()
+        return self._parse_llm_response(response_text), response_text
+    
+    async def _generate_streaming(self, prompt, on_file):
+        """Stream a generation, handing each file to on_file as soon as it closes"""
+        parser = IncrementalFilesParser()
+        response = await self.model.generate_content_async(
+            prompt, generation_config=self.generation_config, stream=True
+        )
+        async for chunk in response:
+            for file_path, content in parser.feed(chunk.text):
+                print(f"  📄 Streamed: {file_path}")
+                on_file(file_path, content)
+        return parser.text.strip()
     
     def _parse_llm_response(self, response_text):
         """Parse LLM response to extract files"""
         try:
-            # Remove markdown code blocks if present
-            if "```json" in response_text:
-                response_text = re.search(r'```json\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-                if response_text:
-                    response_text = response_text.group(1)
-            elif "```" in response_text:
-                response_text = re.search(r'```\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-                if response_text:
-                    response_text = response_text.group(1)
-            
-            # Parse JSON
             data = json.loads(response_text)
-            
-            if isinstance(data, dict) and "files" in data:
-                return data["files"]
-            elif isinstance(data, dict):
-                return data
-            else:
-                return None
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            # Try to find JSON object in text
-            json_match = re.search(r'\{.*"files".*\}', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    data = json.loads(json_match.group(0))
-                    return data.get("files", {})
-                except:
-                    pass
+        except json.JSONDecodeError:
+            # Fenced or chatty output: scan for the outermost object instead
+            data = extract_json_object(response_text)
+        
+        if isinstance(data, dict) and isinstance(data.get("files"), dict):
+            return self._text_files(data["files"])
+        elif isinstance(data, dict) and isinstance(data.get("files"), list):
+            # Schema-constrained form: [{"path": ..., "content": ...}, ...]
+            return {
+                entry["path"]: entry["content"] for entry in data["files"]
+                if isinstance(entry, dict)
+                and isinstance(entry.get("path"), str)
+                and isinstance(entry.get("content"), str)
+            } or None
+        elif isinstance(data, dict) and "files" not in data:
+            return self._text_files(data)
+        else:
             return None
     
-    def _is_analyze_task(self, brief, attachments):
-        """Detect if this is the Analyze task (Python + Excel + CI)"""
-        has_python = any(att['name'].endswith('.py') for att in attachments)
-        has_excel = any(att['name'].endswith(('.xlsx', '.xls')) for att in attachments)
-        mentions_ci = 'github actions' in brief.lower() or 'workflow' in brief.lower() or 'ci.yml' in brief.lower()
-        return has_python and (has_excel or mentions_ci)
+    def _text_files(self, files):
+        """Keep only path -> string entries; anything else can't be committed as a file"""
+        dropped = [file_path for file_path, content in files.items() if not isinstance(content, str)]
+        if dropped:
+            print(f"⚠️ Ignoring non-text file contents for: {', '.join(map(str, dropped))}")
+        return {
+            file_path: content for file_path, content in files.items()
+            if isinstance(file_path, str) and isinstance(content, str)
+        } or None
     
-    def _handle_analyze_task(self, brief, checks, attachments):
-        """Special handler for Analyze task with Python, Excel, and GitHub Actions"""
-        print("🔍 Detected Analyze task - using specialized handler")
+    def _describe_parse_error(self, response_text):
+        """Short explanation of why a response couldn't be turned into files"""
+        if not response_text:
+            return "the response was empty"
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError as e:
+            return f"invalid JSON: {e}"
+        if not isinstance(data, dict) or "files" not in data:
+            return 'the JSON has no "files" field'
+        return 'the "files" field has no usable entries'
+    
+    def _generate_fallback(self, brief, checks, attachments):
+        """Generate basic fallback files when LLM fails"""
+        files = {}
         
+        # Generate index.html
+        files["index.html"] = render("fallback_index.html", brief=brief, checks=html_list_items(checks))
+        
+        # Generate README.md
+        files["README.md"] = render(
+            "fallback_README.md", brief=brief, checks="\n".join(f"- {check}" for check in checks)
+        )
+        
+        return files
+
+def attachment_extension(att):
+    """Lowercased extension of an attachment's name, e.g. '.xlsx'"""
+    return os.path.splitext(att['name'])[1].lower()
+
+class TaskSignals:
+    """What a single classification pass found in a task"""
+
+    def __init__(self, extensions, keywords, check_patterns):
+        self.extensions = extensions
+        self.keywords = keywords
+        self.check_patterns = check_patterns
+
+class TaskHandler:
+    """Deterministic handler for one family of tasks
+    
+    Subclasses declare the signals that identify the family (attachment
+    extensions, brief keywords, check regexes) and implement ``handle()``,
+    which returns the files dict without calling the LLM. By default every
+    kind of signal a handler declares must be present; override
+    ``matches()`` for other rules.
+    """
+    name = "task"
+    extensions = ()
+    keywords = ()
+    check_patterns = ()
+    
+    def matches(self, signals):
+        if self.extensions and not signals.extensions.intersection(self.extensions):
+            return False
+        if self.keywords and not signals.keywords.intersection(self.keywords):
+            return False
+        if self.check_patterns and not signals.check_patterns.intersection(self.check_patterns):
+            return False
+        return bool(self.extensions or self.keywords or self.check_patterns)
+    
+    def handle(self, brief, checks, attachments):
+        raise NotImplementedError
+
+class TaskClassifier:
+    """Match a task against every registered handler in one pass
+    
+    All handlers' keywords are compiled into a single alternation, so the
+    brief is scanned once however many handlers exist; check patterns are
+    likewise combined into one regex with a named group per pattern.
+    """
+    
+    def __init__(self, handlers):
+        self.handlers = list(handlers)
+        keywords = sorted({k.lower() for h in self.handlers for k in h.keywords}, key=len, reverse=True)
+        self.keyword_re = None
+        if keywords:
+            self.keyword_re = re.compile(
+                "|".join(re.escape(k) for k in keywords),
+                re.IGNORECASE
+            )
+        self.check_groups = {}
+        for handler in self.handlers:
+            for pattern in handler.check_patterns:
+                if pattern not in self.check_groups.values():
+                    self.check_groups[f"c{len(self.check_groups)}"] = pattern
+        self.check_re = None
+        if self.check_groups:
+            self.check_re = re.compile(
+                "|".join(f"(?P<{group}>{pattern})" for group, pattern in self.check_groups.items()),
+                re.IGNORECASE
+            )
+    
+    def signals(self, brief, checks, attachments):
+        extensions = {attachment_extension(att) for att in attachments}
+        keywords = set()
+        if self.keyword_re:
+            keywords = {m.group().lower() for m in self.keyword_re.finditer(brief or "")}
+        check_patterns = set()
+        if self.check_re and checks:
+            text = "\n".join(str(check) for check in checks)
+            check_patterns = {self.check_groups[m.lastgroup] for m in self.check_re.finditer(text)}
+        return TaskSignals(extensions, keywords, check_patterns)
+    
+    def classify(self, brief, checks, attachments):
+        """Return the first registered handler that matches, or None"""
+        if not self.handlers:
+            return None
+        signals = self.signals(brief, checks, attachments)
+        for handler in self.handlers:
+            if handler.matches(signals):
+                return handler
+        return None
+
+TASK_HANDLERS = []
+_classifier = None
+
+def register_task_handler(handler_cls):
+    """Class decorator adding a TaskHandler to the registry (checked in registration order)"""
+    global _classifier
+    TASK_HANDLERS.append(handler_cls())
+    _classifier = None
+    return handler_cls
+
+def classify_task(brief, checks, attachments):
+    """Return the registered handler for this task, or None for the LLM path"""
+    global _classifier
+    if _classifier is None:
+        _classifier = TaskClassifier(TASK_HANDLERS)
+    handler = _classifier.classify(brief, checks, attachments)
+    if handler:
+        print(f"🔍 Detected {handler.name} task - using specialized handler")
+    return handler
+
+@register_task_handler
+class AnalyzeTaskHandler(TaskHandler):
+    """Analyze task: Python script plus Excel data or a GitHub Actions brief"""
+    name = "Analyze"
+    extensions = ('.py', '.xlsx', '.xls')
+    keywords = ('github actions', 'workflow', 'ci.yml')
+    
+    def matches(self, signals):
+        has_python = '.py' in signals.extensions
+        has_excel = bool(signals.extensions & {'.xlsx', '.xls'})
+        return has_python and (has_excel or bool(signals.keywords.intersection(self.keywords)))
+    
+    def handle(self, brief, checks, attachments):
+        """Fix the Python typo, convert Excel to CSV, add the CI workflow and README"""
         files = {}
         
         # Process Python file - fix typo
         for att in attachments:
-            if att['name'].endswith('.py'):
+            if attachment_extension(att) == '.py':
                 try:
                     with open(att['path'], 'r', encoding='utf-8') as f:
                         python_code = f.read()
@@ -167,157 +718,22 @@ Generate the files now:"""
         
         # Convert Excel to CSV
         for att in attachments:
-            if att['name'].endswith(('.xlsx', '.xls')):
+            if attachment_extension(att) in ('.xlsx', '.xls'):
                 try:
-                    import pandas as pd
-                    df = pd.read_excel(att['path'])
-                    csv_content = df.to_csv(index=False)
-                    csv_name = att['name'].replace('.xlsx', '.csv').replace('.xls', '.csv')
-                    files[csv_name] = csv_content
+                    # Streamed to disk; the publisher reads the CSV at upload time
+                    csv_name = os.path.splitext(att['name'])[0] + '.csv'
+                    for name, csv_path in excel_to_csv_files(att['path'], csv_name):
+                        files[name] = csv_path
                     print(f"  ✅ Converted Excel to CSV: {csv_name}")
                 except Exception as e:
                     print(f"  ❌ Failed to convert Excel: {e}")
         
         # Generate GitHub Actions workflow
-        files['.github/workflows/ci.yml'] = """name: CI
-
-on:
-  push:
-    branches: [ main ]
-  pull_request:
-    branches: [ main ]
-
-jobs:
-  build:
-    runs-on: ubuntu-latest
-    
-    steps:
-    - uses: actions/checkout@v3
-    
-    - name: Set up Python
-      uses: actions/setup-python@v4
-      with:
-        python-version: '3.11'
-    
-    - name: Install dependencies
-      run: |
-        python -m pip install --upgrade pip
-        pip install ruff pandas
-    
-    - name: Run ruff linter
-      run: |
-        ruff check . || true
-    
-    - name: Run execute.py
-      run: |
-        python execute.py > result.json
-    
-    - name: Upload result.json
-      uses: actions/upload-artifact@v3
-      with:
-        name: result
-        path: result.json
-    
-    - name: Deploy to GitHub Pages
-      uses: peaceiris/actions-gh-pages@v3
-      with:
-        github_token: ${{ secrets.GITHUB_TOKEN }}
-        publish_dir: .
-        publish_branch: gh-pages
-"""
+        files['.github/workflows/ci.yml'] = render('analyze_ci.yml')
         print("  ✅ Generated GitHub Actions workflow")
         
         # Generate README
-        files["README.md"] = f"""# Analyze Task
-
-## Overview
-This project analyzes data using Python and automated CI/CD.
-
-## Files
-- `execute.py`: Main analysis script (typo fixed)
-- `data.csv`: Data file converted from Excel
-- `.github/workflows/ci.yml`: GitHub Actions workflow
-
-## CI/CD Pipeline
-The GitHub Actions workflow:
-1. Runs ruff linter for code quality
-2. Executes `execute.py` to generate `result.json`
-3. Deploys `result.json` to GitHub Pages
-
-## Usage
-Push to main branch to trigger the CI pipeline.
-
-## Result
-View the generated `result.json` on GitHub Pages after CI completes.
-"""
+        files["README.md"] = render("analyze_README.md")
         
         print(f"  ✅ Generated {len(files)} files for Analyze task")
         return files
-    
-    def _generate_fallback(self, brief, checks, attachments):
-        """Generate basic fallback files when LLM fails"""
-        files = {}
-        
-        # Generate index.html
-        files["index.html"] = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Task Application</title>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            max-width: 800px;
-            margin: 50px auto;
-            padding: 20px;
-            background: #f5f5f5;
-        }}
-        .container {{
-            background: white;
-            padding: 30px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        h1 {{ color: #333; }}
-        .brief {{
-            background: #f0f0f0;
-            padding: 15px;
-            border-radius: 5px;
-            margin: 20px 0;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Task Application</h1>
-        <div class="brief">
-            <h2>Brief:</h2>
-            <p>{brief}</p>
-        </div>
-        <h2>Checks:</h2>
-        <ul>
-            {"".join(f"<li>{check}</li>" for check in checks)}
-        </ul>
-    </div>
-</body>
-</html>"""
-        
-        # Generate README.md
-        files["README.md"] = f"""# Task Application
-
-## Brief
-{brief}
-
-## Checks
-{chr(10).join(f"- {check}" for check in checks)}
-
-## Setup
-Open `index.html` in a web browser.
-
-## Files
-- index.html: Main application page
-- README.md: This file
-"""
-        
-        return files
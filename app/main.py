@@ -1,20 +1,85 @@
-from fastapi import FastAPI, Request, BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 import os
+import json
+import asyncio
+import httpx
+from collections import OrderedDict
 from dotenv import load_dotenv
-from app.task_processor import process_task_background
+from app.notifier import NotificationOutbox, NotificationDispatcher
+from app.task_queue import TaskQueue, start_workers, stop_workers, supervise_workers
 
 load_dotenv()
 USER_SECRET = os.getenv("USER_SECRET")
+DEDUPE_CACHE_SIZE = int(os.getenv("DEDUPE_CACHE_SIZE", "1024"))
 
-app = FastAPI(title="TDS Project 1 - LLM Code Deployment")
+class DedupeIndex:
+    """Map (email, task, round, nonce) to a queued task id
+    
+    A bounded LRU answers repeats without touching the database; the unique
+    key in the task queue makes deduplication survive restarts and workers.
+    """
+    
+    def __init__(self, queue, capacity=DEDUPE_CACHE_SIZE):
+        self.queue = queue
+        self.capacity = capacity
+        self._cache = OrderedDict()
+    
+    @staticmethod
+    def key(data):
+        return json.dumps([data.get("email"), data.get("task"), data.get("round", 1), data.get("nonce")])
+    
+    def submit(self, data):
+        """Queue the task unless it was seen before; returns (task_id, duplicate)"""
+        key = self.key(data)
+        task_id = self._cache.get(key)
+        if task_id is not None:
+            self._cache.move_to_end(key)
+            duplicate = True
+        else:
+            task_id, created = self.queue.enqueue_once(data, key)
+            duplicate = not created
+            self._cache[key] = task_id
+            if len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+        return task_id, duplicate
+
+@asynccontextmanager
+async def lifespan(app):
+    """Open the persistent queue, resume interrupted tasks and start workers"""
+    app.state.queue = TaskQueue()
+    app.state.queue.recover()
+    app.state.dedupe = DedupeIndex(app.state.queue)
+    # Each worker process builds its own long-lived GitHub/Gemini/HTTP clients
+    workers, stop_event = start_workers(app.state.queue.db_path)
+    # Replace workers that die and requeue the tasks they held
+    supervisor_stop = asyncio.Event()
+    supervisor_task = asyncio.create_task(
+        supervise_workers(app.state.queue, workers, stop_event, supervisor_stop)
+    )
+    
+    # Notifications written by workers are delivered from this process
+    notify_client = httpx.AsyncClient(http2=True, timeout=30.0)
+    dispatcher = NotificationDispatcher(NotificationOutbox(), notify_client)
+    dispatcher_stop = asyncio.Event()
+    dispatcher_task = asyncio.create_task(dispatcher.run(dispatcher_stop))
+    yield
+    supervisor_stop.set()
+    await supervisor_task
+    await asyncio.to_thread(stop_workers, workers, stop_event)
+    dispatcher_stop.set()
+    await dispatcher_task
+    await notify_client.aclose()
+
+app = FastAPI(title="TDS Project 1 - LLM Code Deployment", lifespan=lifespan)
 
 @app.get("/")
 async def root():
     return {"status": "running", "message": "TDS Project 1 API Server"}
 
 @app.post("/api-endpoint")
-async def api_endpoint(request: Request, background_tasks: BackgroundTasks):
+async def api_endpoint(request: Request):
     try:
         data = await request.json()
         
@@ -25,13 +90,27 @@ async def api_endpoint(request: Request, background_tasks: BackgroundTasks):
                 content={"error": "Invalid secret"}
             )
         
-        # Add background task
-        background_tasks.add_task(process_task_background, data)
+        # Persist the task unless it's a resend; a worker process picks it up
+        task_id, duplicate = request.app.state.dedupe.submit(data)
+        if duplicate:
+            record = request.app.state.queue.get(task_id)
+            if record["status"] == "failed":
+                request.app.state.queue.retry(task_id, data)
+                record["status"] = "queued"
+            print(f"🔁 Duplicate request for task #{task_id} ({record['status']})")
+            return {
+                "status": "accepted",
+                "note": f"duplicate of task {task_id} ({record['status']})",
+                "task_id": task_id,
+                "duplicate": True,
+                "result": record["result"]
+            }
         
         # Immediate 200 response
         return {
             "status": "accepted",
-            "note": f"processing round {data.get('round', 1)} started"
+            "note": f"processing round {data.get('round', 1)} started",
+            "task_id": task_id
         }
         
     except Exception as e:
@@ -40,3 +119,14 @@ async def api_endpoint(request: Request, background_tasks: BackgroundTasks):
             status_code=500,
             content={"error": str(e)}
         )
+
+@app.get("/tasks/{task_id}")
+async def task_status(task_id: int, request: Request):
+    # The result holds submitters' emails and nonces; ids are guessable
+    secret = request.headers.get("X-Secret") or request.query_params.get("secret")
+    if not USER_SECRET or secret != USER_SECRET:
+        return JSONResponse(status_code=403, content={"error": "Invalid secret"})
+    record = request.app.state.queue.get(task_id)
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown task"})
+    return record
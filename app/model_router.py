@@ -0,0 +1,213 @@
+import os
+import time
+import asyncio
+from collections import deque
+import google.generativeai as genai
+
+LLM_MODELS = [name.strip() for name in os.getenv("LLM_MODELS", "gemini-2.0-flash-exp,gemini-1.5-flash").split(",") if name.strip()]
+MODEL_TIMEOUT = float(os.getenv("LLM_MODEL_TIMEOUT", "120"))
+# Whole-stream bound; MODEL_TIMEOUT alone only limits the gap between chunks
+STREAM_DEADLINE = float(os.getenv("LLM_STREAM_DEADLINE", "300"))
+HEDGING = os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+HEDGE_DEFAULT_DELAY = 20.0
+HEDGE_MIN_DELAY = 2.0
+LATENCY_WINDOW = 50
+MIN_SAMPLES_FOR_P95 = 5
+EWMA_ALPHA = 0.3
+
+class _ModelStats:
+    """Rolling latency and failure record for one model"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ewma = None
+        self.consecutive_failures = 0
+
+    def record_latency(self, latency):
+        self.latencies.append(latency)
+        self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+
+    def record_success(self, latency):
+        self.record_latency(latency)
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+
+    def score(self):
+        """Lower is better; recent failures count as timeouts"""
+        return (self.ewma or 0.0) + self.consecutive_failures * MODEL_TIMEOUT
+
+    def hedge_delay(self):
+        """When to fire a backup request: the observed p95 latency"""
+        if len(self.latencies) < MIN_SAMPLES_FOR_P95:
+            return HEDGE_DEFAULT_DELAY
+        ordered = sorted(self.latencies)
+        return max(HEDGE_MIN_DELAY, ordered[int(0.95 * (len(ordered) - 1))])
+
+class ModelRouter:
+    """Route Gemini calls across models by observed latency, with hedging
+
+    Drop-in for ``GenerativeModel.generate_content_async``. Each call has a
+    per-model timeout; a failed or timed-out model falls through to the next.
+    With hedging on, a second model is also asked once the first has run past
+    its p95 latency, and whichever answers first wins. Streams are hedged the
+    same way up to their first chunk, and are bounded by a total deadline.
+    """
+
+    def __init__(self, model_names=None, timeout=MODEL_TIMEOUT, hedging=HEDGING, stream_deadline=STREAM_DEADLINE):
+        self.model_names = list(model_names or LLM_MODELS)
+        self.models = {name: genai.GenerativeModel(name) for name in self.model_names}
+        self.stats = {name: _ModelStats() for name in self.model_names}
+        self.timeout = timeout
+        self.hedging = hedging
+        self.stream_deadline = stream_deadline
+
+    def ranked(self):
+        """Models best-first; configured order breaks ties"""
+        return sorted(self.model_names, key=lambda name: self.stats[name].score())
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        if stream:
+            return self._stream(prompt, generation_config)
+
+        ranked = self.ranked()
+        primary, backups = ranked[0], ranked[1:]
+        hedge_at = self.stats[primary].hedge_delay() if self.hedging and backups else None
+        tasks = {asyncio.create_task(self._call(primary, prompt, generation_config)): primary}
+        errors = []
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_at, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slower than usual: race a backup against it
+                    name = backups.pop(0)
+                    print(f"🏁 {primary} past p95 ({hedge_at:.1f}s), hedging with {name}")
+                    tasks[asyncio.create_task(self._call(name, prompt, generation_config))] = name
+                    hedge_at = None
+                    continue
+
+                for task in done:
+                    name = tasks.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        errors.append(f"{name}: {e or type(e).__name__}")
+
+                if not tasks and backups:
+                    name = backups.pop(0)
+                    print(f"↪️ Falling back to {name}")
+                    tasks[asyncio.create_task(self._call(name, prompt, generation_config))] = name
+                    hedge_at = None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        raise RuntimeError("all models failed: " + "; ".join(errors))
+
+    async def _call(self, name, prompt, generation_config):
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.models[name].generate_content_async(prompt, generation_config=generation_config),
+                self.timeout
+            )
+            response.text  # raises if the model returned no usable candidate
+        except asyncio.CancelledError:
+            # Lost a hedge race: the elapsed time is a lower bound on its latency
+            self.stats[name].record_latency(time.monotonic() - start)
+            raise
+        except Exception:
+            self.stats[name].record_failure()
+            raise
+        self.stats[name].record_success(time.monotonic() - start)
+        return response
+
+    async def _open_stream(self, name, prompt, generation_config):
+        """Start a stream and wait for its first chunk; returns (chunks, first chunk or None, start)"""
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.models[name].generate_content_async(
+                    prompt, generation_config=generation_config, stream=True
+                ),
+                self.timeout
+            )
+            chunks = response.__aiter__()
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+            except StopAsyncIteration:
+                first = None
+        except asyncio.CancelledError:
+            self.stats[name].record_latency(time.monotonic() - start)
+            raise
+        except Exception:
+            self.stats[name].record_failure()
+            raise
+        return chunks, first, start
+
+    async def _stream(self, prompt, generation_config):
+        """Stream from the best model, hedging and failing over until the first chunk
+
+        Once output has reached the caller the model can't be switched, so later
+        failures (including the total deadline) propagate.
+        """
+        backups = self.ranked()
+        primary = backups.pop(0)
+        hedge_at = self.stats[primary].hedge_delay() if self.hedging and backups else None
+        tasks = {asyncio.create_task(self._open_stream(primary, prompt, generation_config)): primary}
+        errors = []
+        winner = None
+
+        try:
+            while tasks and winner is None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_at, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    name = backups.pop(0)
+                    print(f"🏁 {primary} stream past p95 ({hedge_at:.1f}s), hedging with {name}")
+                    tasks[asyncio.create_task(self._open_stream(name, prompt, generation_config))] = name
+                    hedge_at = None
+                    continue
+
+                for task in done:
+                    name = tasks.pop(task)
+                    try:
+                        winner = (name, *task.result())
+                        break
+                    except Exception as e:
+                        errors.append(f"{name}: {e or type(e).__name__}")
+                        print(f"↪️ {name} failed before streaming ({e})")
+
+                if winner is None and not tasks and backups:
+                    name = backups.pop(0)
+                    print(f"↪️ Falling back to {name}")
+                    tasks[asyncio.create_task(self._open_stream(name, prompt, generation_config))] = name
+                    hedge_at = None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if winner is None:
+            raise RuntimeError("all models failed: " + "; ".join(errors))
+
+        name, chunks, first, start = winner
+        deadline = start + self.stream_deadline
+        try:
+            if first is not None:
+                yield first
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"{name} stream exceeded {self.stream_deadline:.0f}s")
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), min(self.timeout, remaining))
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats[name].record_failure()
+            raise
+        self.stats[name].record_success(time.monotonic() - start)
@@ -1,38 +1,218 @@
-import httpx
+import json
 import time
+import random
+import asyncio
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from urllib.parse import urlsplit
+from app.task_queue import DATA_DIR
 
-def notify_evaluation(evaluation_url, payload, max_retries=5):
-    """Notify evaluation server with exponential backoff"""
-    if not evaluation_url:
-        print("⚠️ No evaluation URL provided")
-        return False
-    
-    headers = {"Content-Type": "application/json"}
-    delay = 2
-    
-    for attempt in range(max_retries):
+OUTBOX_DB = DATA_DIR / "outbox.db"
+MAX_ATTEMPTS = 8
+BASE_DELAY = 2.0
+MAX_DELAY = 300.0
+PER_HOST_CONCURRENCY = 4
+# Must exceed the 30 s send timeout: a lease is renewed just before each send
+LEASE_SECONDS = 60.0
+MAX_IN_FLIGHT = 32
+POLL_INTERVAL = 1.0
+
+class NotificationOutbox:
+    """Persistent outbox of evaluation notifications (SQLite, WAL mode)
+
+    Task workers only append here; NotificationDispatcher delivers. Rows are
+    leased while in flight, so a crash mid-delivery just retries them later.
+    """
+
+    def __init__(self, db_path=OUTBOX_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, url, payload):
+        """Store a notification for delivery and return its id"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (url, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                (url, json.dumps(payload), now, now)
+            )
+            return cursor.lastrowid
+
+    def claim_due(self, limit, exclude=()):
+        """Lease up to `limit` due notifications not in `exclude`
+
+        Returns (id, url, payload, attempts, lease_until) rows; pass
+        ``lease_until`` to renew_lease() before sending.
+        """
+        now = time.time()
+        lease_until = now + LEASE_SECONDS
+        exclude = list(exclude)
+        conn = self._connect()
         try:
-            print(f"📨 Notification attempt {attempt + 1}/{max_retries}...")
-            response = httpx.post(
-                evaluation_url,
-                json=payload,
-                headers=headers,
-                timeout=30.0
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, url, payload, attempts FROM outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? "
+                f"AND id NOT IN ({','.join('?' * len(exclude))}) "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, *exclude, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(lease_until, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+            return [
+                (row["id"], row["url"], json.loads(row["payload"]), row["attempts"], lease_until)
+                for row in rows
+            ]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def renew_lease(self, notification_id, lease_until):
+        """Extend a lease we still hold; returns the new expiry, or None if it was lost"""
+        renewed = time.time() + LEASE_SECONDS
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE outbox SET next_attempt_at = ? "
+                "WHERE id = ? AND status = 'pending' AND next_attempt_at = ?",
+                (renewed, notification_id, lease_until)
             )
-            
-            if response.status_code == 200:
-                print(f"✅ Evaluation server notified successfully")
-                return True
+            return renewed if cursor.rowcount else None
+
+    def mark_sent(self, notification_id):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1 WHERE id = ?",
+                (notification_id,)
+            )
+
+    def mark_failed(self, notification_id, error, retry_in=None):
+        """Record a failed attempt; retry after `retry_in` seconds or give up if None"""
+        with closing(self._connect()) as conn:
+            if retry_in is None:
+                conn.execute(
+                    "UPDATE outbox SET status = 'dead', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (error, notification_id)
+                )
             else:
-                print(f"⚠️ Server responded with {response.status_code}: {response.text[:200]}")
-                
-        except Exception as e:
-            print(f"❌ Notification attempt {attempt + 1} failed: {e}")
-        
-        if attempt < max_retries - 1:
-            print(f"⏳ Waiting {delay}s before retry...")
-            time.sleep(delay)
-            delay *= 2
-    
-    print("❌ Failed to notify evaluation server after all retries")
-    return False
+                conn.execute(
+                    "UPDATE outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                    (error, time.time() + retry_in, notification_id)
+                )
+
+def notify_evaluation(evaluation_url, payload, outbox=None):
+    """Queue a notification for the evaluation server; delivery happens in the dispatcher"""
+    if not evaluation_url:
+        print("⚠️ No evaluation URL provided")
+        return None
+
+    outbox = outbox or NotificationOutbox()
+    notification_id = outbox.enqueue(evaluation_url, payload)
+    print(f"📨 Notification #{notification_id} queued for {urlsplit(evaluation_url).netloc}")
+    return notification_id
+
+async def send_notification(client, evaluation_url, payload):
+    """Single delivery attempt; returns None on success or an error description"""
+    try:
+        response = await client.post(
+            evaluation_url,
+            json=payload,
+            headers={"Content-Type": "application/json"},
+            timeout=30.0
+        )
+        if response.status_code == 200:
+            return None
+        return f"HTTP {response.status_code}: {response.text[:200]}"
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+class NotificationDispatcher:
+    """Deliver queued notifications with per-host limits and jittered backoff"""
+
+    def __init__(self, outbox, client, per_host=PER_HOST_CONCURRENCY, max_attempts=MAX_ATTEMPTS):
+        self.outbox = outbox
+        self.client = client
+        self.per_host = per_host
+        self.max_attempts = max_attempts
+        self._host_slots = {}
+        self._in_flight = {}
+
+    def _slots(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return self._host_slots[host]
+
+    async def run(self, stop_event):
+        """Deliver until stop_event is set, then wait for in-flight sends"""
+        print("📬 Notification dispatcher started")
+        while not stop_event.is_set():
+            # Only lease what can start soon, so leases don't expire while queued here
+            free = MAX_IN_FLIGHT - len(self._in_flight)
+            due = []
+            if free > 0:
+                try:
+                    due = await asyncio.to_thread(self.outbox.claim_due, min(50, free), list(self._in_flight))
+                except Exception as e:
+                    print(f"❌ Outbox read failed: {e}")
+
+            for row in due:
+                notification_id = row[0]
+                task = asyncio.create_task(self._deliver(*row))
+                self._in_flight[notification_id] = task
+                task.add_done_callback(lambda _, key=notification_id: self._in_flight.pop(key, None))
+
+            if not due:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+        await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+
+    async def _deliver(self, notification_id, url, payload, attempts, lease_until):
+        async with self._slots(url):
+            # The lease may have expired while waiting for a slot and been taken by another dispatcher
+            if await asyncio.to_thread(self.outbox.renew_lease, notification_id, lease_until) is None:
+                print(f"⏭️ Notification #{notification_id} lease lost, leaving it to its new owner")
+                return
+            print(f"📨 Notification #{notification_id} attempt {attempts + 1}/{self.max_attempts}...")
+            error = await send_notification(self.client, url, payload)
+
+        if error is None:
+            print(f"✅ Notification #{notification_id} delivered")
+            await asyncio.to_thread(self.outbox.mark_sent, notification_id)
+        elif attempts + 1 >= self.max_attempts:
+            print(f"❌ Notification #{notification_id} failed after all retries: {error}")
+            await asyncio.to_thread(self.outbox.mark_failed, notification_id, error)
+        else:
+            # Full jitter keeps retries to a flaky server from arriving in lockstep
+            retry_in = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempts))
+            print(f"⚠️ Notification #{notification_id} failed ({error}), retrying in {retry_in:.1f}s")
+            await asyncio.to_thread(self.outbox.mark_failed, notification_id, error, retry_in)
@@ -0,0 +1,417 @@
+"""
+Local preview of a generated app: serve the files dict from memory and
+evaluate the JS-style checks against its static DOM, without a Pages deploy
+
+    python -m app.preview path/to/site --task task.json [--serve]
+"""
+import re
+import ast
+import sys
+import json
+import argparse
+import mimetypes
+import threading
+import urllib.request
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+PREVIEW_HOST = "127.0.0.1"
+
+class PreviewServer:
+    """Static HTTP server for a ``{path: content}`` dict, on a free local port
+
+    Content may be str, bytes or a Path (read per request). Use as a context
+    manager; ``url`` is the site root.
+    """
+
+    def __init__(self, files, host=PREVIEW_HOST, port=0):
+        self.files = files
+        handler = type("PreviewHandler", (_PreviewHandler,), {"files": files})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="preview-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    files = {}
+
+    def do_GET(self):
+        body = self._lookup(unquote(urlsplit(self.path).path).lstrip("/"))
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", self._content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _lookup(self, file_path):
+        # Like Pages: directories serve their index.html
+        for candidate in (file_path, f"{file_path.rstrip('/')}/index.html".lstrip("/")):
+            content = self.files.get(candidate)
+            if content is None:
+                continue
+            self._content_type = mimetypes.guess_type(candidate)[0] or "application/octet-stream"
+            if isinstance(content, Path):
+                return content.read_bytes()
+            if isinstance(content, str):
+                self._content_type += "; charset=utf-8"
+                return content.encode("utf-8")
+            return content
+        return None
+
+    def log_message(self, format, *args):
+        pass
+
+class Element:
+    """Minimal DOM node: enough for selectors and textContent"""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+
+    @property
+    def classes(self):
+        return self.attrs.get("class", "").split()
+
+    @property
+    def text_content(self):
+        return "".join(child if isinstance(child, str) else child.text_content for child in self.children)
+
+    def iter(self):
+        for child in self.children:
+            if isinstance(child, Element):
+                yield child
+                yield from child.iter()
+
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr"
+}
+
+# Start tags that implicitly close an open element of these types (e.g. <li> after <li>)
+_IMPLIED_END = {
+    "li": {"li"}, "p": {"p"}, "option": {"option"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"},
+    "tr": {"tr", "td", "th"}, "td": {"td", "th"}, "th": {"td", "th"}
+}
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        while self.current.tag in _IMPLIED_END.get(tag, ()):
+            self.current = self.current.parent
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        if tag not in _VOID_TAGS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Element(tag, {name: value or "" for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+def parse_html(text):
+    builder = _TreeBuilder()
+    builder.feed(text)
+    builder.close()
+    return builder.root
+
+class UnsupportedCheck(Exception):
+    """The check needs more than the static DOM harness can evaluate"""
+
+_SELECTOR_TOKEN = re.compile(
+    r"\s*(?P<comb>[>+~])\s*|(?P<space>\s+)|(?P<tag>[A-Za-z][\w-]*|\*)|#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)"
+    r"|\[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~^$*]?=)\s*(?P<val>\"[^\"]*\"|'[^']*'|[^\]\s]+)\s*)?\]"
+)
+
+def compile_selector(selector):
+    """Parse a CSS selector list into [[(combinator, compound), ...], ...]
+
+    Supports type, #id, .class and [attr] selectors with descendant and
+    child combinators; anything else raises UnsupportedCheck.
+    """
+    chains = []
+    for part in selector.split(","):
+        part = part.strip()
+        chain = []
+        compound = []
+        combinator = " "
+        pos = 0
+        while pos < len(part):
+            match = _SELECTOR_TOKEN.match(part, pos)
+            if match is None or match.end() == pos:
+                raise UnsupportedCheck(f"selector '{selector}'")
+            pos = match.end()
+            if match.group("comb") or match.group("space"):
+                if match.group("comb") in ("+", "~"):
+                    raise UnsupportedCheck(f"sibling combinator in '{selector}'")
+                if compound:
+                    chain.append((combinator, compound))
+                    compound = []
+                combinator = match.group("comb") or " "
+            elif match.group("tag"):
+                compound.append(("tag", match.group("tag").lower()))
+            elif match.group("id"):
+                compound.append(("id", match.group("id")))
+            elif match.group("cls"):
+                compound.append(("cls", match.group("cls")))
+            else:
+                value = match.group("val")
+                if value and value[0] in "\"'":
+                    value = value[1:-1]
+                compound.append(("attr", (match.group("attr").lower(), match.group("op"), value)))
+        if not compound:
+            raise UnsupportedCheck(f"selector '{selector}'")
+        chain.append((combinator, compound))
+        chains.append(chain)
+    return chains
+
+def _matches_compound(element, compound):
+    for kind, value in compound:
+        if kind == "tag":
+            if value != "*" and element.tag != value:
+                return False
+        elif kind == "id":
+            if element.attrs.get("id") != value:
+                return False
+        elif kind == "cls":
+            if value not in element.classes:
+                return False
+        else:
+            name, op, expected = value
+            actual = element.attrs.get(name)
+            if actual is None:
+                return False
+            if op == "=" and actual != expected:
+                return False
+            if op == "~=" and expected not in actual.split():
+                return False
+            if op == "^=" and not actual.startswith(expected):
+                return False
+            if op == "$=" and not actual.endswith(expected):
+                return False
+            if op == "*=" and expected not in actual:
+                return False
+    return True
+
+def _matches_chain(element, chain):
+    *ancestors, (_, compound) = chain
+    if not _matches_compound(element, compound):
+        return False
+    # The combinator stored with each compound links it to the one before
+    node = element
+    combinator = chain[-1][0]
+    for combinator_before, compound in reversed(ancestors):
+        node = node.parent
+        if combinator == ">":
+            if node is None or node.tag == "#document" or not _matches_compound(node, compound):
+                return False
+        else:
+            while node is not None and node.tag != "#document" and not _matches_compound(node, compound):
+                node = node.parent
+            if node is None or node.tag == "#document":
+                return False
+        combinator = combinator_before
+    return True
+
+def query_selector_all(root, selector):
+    chains = compile_selector(selector)
+    return [element for element in root.iter() if any(_matches_chain(element, chain) for chain in chains)]
+
+# A JS string literal, then the expression shapes the harness understands
+_JS_STRING = r"""(?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`$\\]*`)"""
+_CHECK = re.compile(
+    rf"""^(?P<not>!!?)?\s*document\.(?:(?P<title>title)|(?P<method>querySelectorAll|querySelector|getElementById)\(\s*(?P<arg>{_JS_STRING})\s*\))
+    (?P<props>(?:\??\.(?:textContent|innerText|length|trim\(\)|toLowerCase\(\)|toUpperCase\(\)))*)
+    (?:\??\.includes\(\s*(?P<includes>{_JS_STRING})\s*\)
+      |\s*(?P<op>===|!==|==|!=|>=|<=|>|<)\s*(?P<rhs>{_JS_STRING}|-?\d+(?:\.\d+)?|null|true|false))?$""",
+    re.VERBOSE
+)
+_PROPERTY = re.compile(r"\??\.(textContent|innerText|length|trim\(\)|toLowerCase\(\)|toUpperCase\(\))")
+
+def _js_literal(token):
+    if token in ("null", "true", "false"):
+        return {"null": None, "true": True, "false": False}[token]
+    if token[0] == "`":
+        return token[1:-1]
+    return ast.literal_eval(token)
+
+def _compare(left, op, right):
+    if op in ("===", "=="):
+        return left == right
+    if op in ("!==", "!="):
+        return left != right
+    if left is None or right is None:
+        return False
+    return {">": left > right, ">=": left >= right, "<": left < right, "<=": left <= right}[op]
+
+def _normalize_check(check):
+    text = str(check).strip()
+    text = re.sub(r"^js\s*:\s*", "", text, flags=re.IGNORECASE)
+    return text.rstrip(";").strip()
+
+def evaluate_check(root, check):
+    """Evaluate one check against a parsed document; returns True/False
+
+    Raises UnsupportedCheck for anything outside the supported subset.
+    """
+    match = _CHECK.match(_normalize_check(check))
+    if match is None:
+        raise UnsupportedCheck("expression not supported")
+
+    if match.group("title"):
+        title = next((e for e in root.iter() if e.tag == "title"), None)
+        value = title.text_content if title else ""
+    else:
+        arg = _js_literal(match.group("arg"))
+        method = match.group("method")
+        if method == "getElementById":
+            value = next((e for e in root.iter() if e.attrs.get("id") == arg), None)
+        elif method == "querySelector":
+            value = next(iter(query_selector_all(root, arg)), None)
+        else:
+            value = query_selector_all(root, arg)
+
+    for prop in _PROPERTY.findall(match.group("props")):
+        if value is None:
+            # Property access on null throws in the browser, so the check fails
+            return False
+        if prop in ("textContent", "innerText"):
+            if not isinstance(value, Element):
+                raise UnsupportedCheck(f"{prop} of a non-element")
+            value = value.text_content
+            if prop == "innerText":
+                value = re.sub(r"\s+", " ", value).strip()
+        elif prop == "length":
+            value = len(value)
+        elif prop == "trim()":
+            value = value.strip()
+        elif prop == "toLowerCase()":
+            value = value.lower()
+        else:
+            value = value.upper()
+
+    if match.group("includes"):
+        result = isinstance(value, str) and _js_literal(match.group("includes")) in value
+    elif match.group("op"):
+        result = _compare(value, match.group("op"), _js_literal(match.group("rhs")))
+    elif isinstance(value, (Element, list)):
+        result = True
+    else:
+        result = bool(value)
+
+    if match.group("not") == "!":
+        return not result
+    return result
+
+def run_checks(files, checks, page="index.html"):
+    """Serve the files locally and evaluate the checks against ``page``
+
+    Returns a list of ``{"check", "status", "detail"}`` with status "pass",
+    "fail" or "skip". Text checks that fail on a page with scripts are
+    skipped, since the content may be filled in by JavaScript.
+    """
+    with PreviewServer(files) as server:
+        try:
+            with urllib.request.urlopen(server.url + page, timeout=10) as response:
+                root = parse_html(response.read().decode("utf-8", errors="replace"))
+        except Exception as e:
+            return [{"check": check, "status": "fail", "detail": f"could not load {page}: {e}"} for check in checks]
+
+    has_scripts = any(e.tag == "script" for e in root.iter())
+    results = []
+    for check in checks:
+        try:
+            passed = evaluate_check(root, check)
+        except UnsupportedCheck as e:
+            results.append({"check": check, "status": "skip", "detail": str(e)})
+            continue
+        except Exception as e:
+            results.append({"check": check, "status": "fail", "detail": f"error: {e}"})
+            continue
+        if not passed and has_scripts and re.search(r"textContent|innerText|length", str(check)):
+            results.append({"check": check, "status": "skip", "detail": "may depend on JavaScript"})
+        else:
+            results.append({"check": check, "status": "pass" if passed else "fail", "detail": ""})
+    return results
+
+def print_report(results):
+    icons = {"pass": "✅", "fail": "❌", "skip": "⏭️ "}
+    for result in results:
+        detail = f" ({result['detail']})" if result["detail"] else ""
+        print(f"  {icons[result['status']]} {result['check']}{detail}")
+    counts = {status: sum(r["status"] == status for r in results) for status in icons}
+    print(f"\n📊 {counts['pass']} passed, {counts['fail']} failed, {counts['skip']} skipped")
+
+def load_directory(directory):
+    """Files dict for a local site directory (contents read lazily)"""
+    directory = Path(directory)
+    return {
+        path.relative_to(directory).as_posix(): path
+        for path in sorted(directory.rglob("*"))
+        if path.is_file() and ".git" not in path.relative_to(directory).parts
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preview a generated app and run its checks locally")
+    parser.add_argument("directory", help="site directory to serve")
+    parser.add_argument("--task", help="task request JSON whose 'checks' to run")
+    parser.add_argument("--check", action="append", default=[], help="extra check expression (repeatable)")
+    parser.add_argument("--serve", action="store_true", help="keep serving until interrupted")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    files = load_directory(args.directory)
+    checks = list(args.check)
+    if args.task:
+        checks += json.loads(Path(args.task).read_text(encoding="utf-8")).get("checks", [])
+
+    if checks:
+        print(f"\n🔎 Running {len(checks)} checks against {args.directory}")
+        results = run_checks(files, checks)
+        print_report(results)
+        if not args.serve:
+            return 1 if any(r["status"] == "fail" for r in results) else 0
+
+    with PreviewServer(files, port=args.port) as server:
+        print(f"🌐 Serving {len(files)} files at {server.url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
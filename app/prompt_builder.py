@@ -0,0 +1,162 @@
+import os
+import csv
+import json
+
+ATTACHMENT_TOKEN_BUDGET = int(os.getenv("ATTACHMENT_TOKEN_BUDGET", "4000"))
+CHARS_PER_TOKEN = 4
+CSV_SAMPLE_ROWS = 5
+CSV_MAX_DISTINCT = 20
+JSON_MAX_BYTES = 5 * 1024 * 1024
+JSON_SAMPLE_ITEMS = 20
+TEXT_EXTENSIONS = ('.txt', '.md', '.py', '.js', '.html', '.css', '.xml', '.svg', '.yml', '.yaml')
+
+def estimate_tokens(text):
+    """Approximate Gemini token count (about 4 characters per token)
+
+    Local and instant; exact counts would cost a count_tokens round trip.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 15)].rstrip() + "\n  [truncated]"
+
+def build_attachment_context(attachments, budget=ATTACHMENT_TOKEN_BUDGET):
+    """Describe attachments for the prompt within a token budget
+
+    Structured files are summarised (CSV header, sample rows and column
+    stats; JSON inferred schema) instead of pasted. Budget a section leaves
+    unused is handed on to the following attachments.
+    """
+    if not attachments:
+        return ""
+
+    context = "\n\nAttachments provided:\n"
+    remaining = budget
+    for index, att in enumerate(attachments):
+        share = remaining // (len(attachments) - index)
+        section = f"- {att['name']} ({att['mime']}, {att['size']} bytes)\n"
+        try:
+            detail = summarize_attachment(att)
+        except Exception as e:
+            detail = f"(could not summarise: {e})"
+        if detail:
+            body_tokens = max(0, share - estimate_tokens(section))
+            section += truncate_to_tokens(_indent(detail), body_tokens) + "\n"
+        tokens = estimate_tokens(section)
+        remaining -= tokens
+        context += section
+        print(f"  🧮 {att['name']}: ~{tokens} prompt tokens")
+    return context
+
+def summarize_attachment(att):
+    """Return a compact textual summary of an attachment, or "" for binaries"""
+    name = att['name'].lower()
+    if name.endswith('.csv'):
+        return summarize_csv(att['path'])
+    if name.endswith('.json'):
+        return summarize_json(att['path'], att['size'])
+    if att['mime'].startswith('text') or name.endswith(TEXT_EXTENSIONS):
+        with open(att['path'], 'r', encoding='utf-8', errors='ignore') as f:
+            return "Preview:\n" + f.read(ATTACHMENT_TOKEN_BUDGET * CHARS_PER_TOKEN)
+    return ""
+
+def summarize_csv(path):
+    """Header, sample rows and per-column stats, streamed in one pass"""
+    with open(path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return "Empty CSV"
+        columns = [_ColumnStats() for _ in header]
+        samples = []
+        row_count = 0
+        for row in reader:
+            row_count += 1
+            if len(samples) < CSV_SAMPLE_ROWS:
+                samples.append(row)
+            for stats, value in zip(columns, row):
+                stats.add(value)
+
+    lines = [f"CSV with {row_count} rows, {len(header)} columns", "Header: " + ",".join(header), "Sample rows:"]
+    lines += ["  " + ",".join(row) for row in samples]
+    lines.append("Columns:")
+    lines += [f"  {name}: {stats.describe()}" for name, stats in zip(header, columns)]
+    return "\n".join(lines)
+
+class _ColumnStats:
+    def __init__(self):
+        self.count = 0
+        self.numeric = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.distinct = set()
+        self.too_many_distinct = False
+
+    def add(self, value):
+        value = value.strip()
+        if not value:
+            return
+        self.count += 1
+        try:
+            number = float(value.replace(",", ""))
+        except ValueError:
+            number = None
+        if number is not None:
+            self.numeric += 1
+            self.total += number
+            self.minimum = number if self.minimum is None else min(self.minimum, number)
+            self.maximum = number if self.maximum is None else max(self.maximum, number)
+        if not self.too_many_distinct:
+            self.distinct.add(value)
+            if len(self.distinct) > CSV_MAX_DISTINCT:
+                self.too_many_distinct = True
+                self.distinct = set()
+
+    def describe(self):
+        if self.count == 0:
+            return "empty"
+        if self.numeric == self.count:
+            mean = self.total / self.numeric
+            return f"numeric, min {self.minimum:g}, max {self.maximum:g}, mean {mean:.4g}"
+        if self.too_many_distinct:
+            return f"text, {self.count} values, more than {CSV_MAX_DISTINCT} distinct"
+        values = ", ".join(sorted(self.distinct)[:CSV_MAX_DISTINCT])
+        return f"text, {len(self.distinct)} distinct: {values}"
+
+def summarize_json(path, size):
+    """Inferred structure of a JSON file"""
+    if size > JSON_MAX_BYTES:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return "Large JSON, preview:\n" + f.read(2000)
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        data = json.load(f)
+    return "JSON schema: " + json.dumps(infer_json_schema(data), separators=(",", ": "))
+
+def infer_json_schema(value, depth=0):
+    """Describe a JSON value's shape, merging a sample of array items"""
+    if isinstance(value, dict):
+        if depth >= 6:
+            return "object"
+        return {key: infer_json_schema(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, list):
+        if not value:
+            return "array (empty)"
+        item_schemas = [infer_json_schema(item, depth + 1) for item in value[:JSON_SAMPLE_ITEMS]]
+        merged = item_schemas[0]
+        if all(schema == merged for schema in item_schemas):
+            return [merged, f"{len(value)} items"]
+        return [item_schemas[0], f"{len(value)} items, mixed shapes"]
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, (int, float)):
+        return "number"
+    if value is None:
+        return "null"
+    return "string"
+
+def _indent(text):
+    return "\n".join("  " + line for line in text.splitlines())
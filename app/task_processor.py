@@ -1,24 +1,52 @@
 import os
 import json
 import base64
-import time
+import asyncio
+import httpx
 from pathlib import Path
+from urllib.parse import unquote_to_bytes
 from dotenv import load_dotenv
+from app.attachment_store import AttachmentStore
+from app.generation_cache import GenerationCache
 from app.github_manager import GitHubManager
 from app.llm_handler import LLMHandler
-from app.notifier import notify_evaluation
+from app.notifier import NotificationOutbox, notify_evaluation
+from app.validator import validate_files
 
 load_dotenv()
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+MAX_ATTACHMENT_BYTES = int(os.getenv("MAX_ATTACHMENT_BYTES", str(25 * 1024 * 1024)))
+MAX_REQUEST_ATTACHMENT_BYTES = int(os.getenv("MAX_REQUEST_ATTACHMENT_BYTES", str(100 * 1024 * 1024)))
+DECODE_CHUNK_CHARS = 64 * 1024  # multiple of 4, so chunks stay base64-aligned
+_WHITESPACE = str.maketrans("", "", " \t\r\n")
 
-def decode_attachments(attachments):
-    """Decode base64 attachments and save to temp directory"""
+def create_clients():
+    """Build the long-lived clients a worker shares across all of its tasks"""
+    http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+    )
+    return {
+        "github_mgr": GitHubManager(GITHUB_TOKEN, GITHUB_USERNAME, http_client=http_client),
+        "llm_handler": LLMHandler(GEMINI_API_KEY, cache=GenerationCache()),
+        "http_client": http_client,
+        "outbox": NotificationOutbox(),
+        "attachment_store": AttachmentStore()
+    }
+
+def decode_attachments(attachments, store, workspace):
+    """Decode data-URL attachments into the task's workspace
+    
+    Base64 is decoded in chunks straight to disk, so the decoded bytes are
+    never held in memory. The returned records carry a path, size and SHA-256;
+    content is read lazily when it's needed.
+    """
     saved_files = []
-    temp_dir = Path("/tmp/attachments")
-    temp_dir.mkdir(exist_ok=True)
+    request_total = 0
     
     for att in attachments or []:
         try:
@@ -27,31 +55,90 @@ def decode_attachments(attachments):
             
             if url.startswith("data:"):
                 # Parse data URL
-                header, b64_data = url.split(",", 1)
+                header, _, encoded = url.partition(",")
                 mime_type = header.split(";")[0].replace("data:", "")
                 
-                # Decode base64
-                file_data = base64.b64decode(b64_data)
+                # Reject oversized attachments before decoding anything
+                estimated = len(encoded) * 3 // 4 if header.endswith(";base64") else len(encoded)
+                if estimated > MAX_ATTACHMENT_BYTES:
+                    raise ValueError(f"attachment exceeds {MAX_ATTACHMENT_BYTES} bytes")
+                if request_total + estimated > MAX_REQUEST_ATTACHMENT_BYTES:
+                    raise ValueError(f"request attachments exceed {MAX_REQUEST_ATTACHMENT_BYTES} bytes")
                 
-                # Save file
-                file_path = temp_dir / name
-                with open(file_path, "wb") as f:
-                    f.write(file_data)
+                # Decode into the content-addressed store
+                if header.endswith(";base64"):
+                    write_content = lambda f: _decode_base64_to_file(encoded, f)
+                else:
+                    write_content = lambda f: f.write(unquote_to_bytes(encoded))
+                file_path, sha256, size = store.ingest(workspace, name, write_content)
+                request_total += size
                 
                 saved_files.append({
-                    "name": name,
+                    "name": file_path.relative_to(workspace).as_posix(),
                     "path": str(file_path),
-                    "data": file_data,
+                    "size": size,
+                    "sha256": sha256,
                     "mime": mime_type
                 })
-                print(f"✅ Decoded attachment: {name} ({len(file_data)} bytes)")
+                print(f"✅ Decoded attachment: {name} ({size} bytes)")
         except Exception as e:
             print(f"❌ Failed to decode attachment {att.get('name')}: {e}")
     
     return saved_files
 
-def process_task_background(data):
-    """Background task processor"""
+def _decode_base64_to_file(encoded, f):
+    """Decode a base64 string into a file chunk by chunk; returns bytes written"""
+    written = 0
+    pending = ""
+    for start in range(0, len(encoded), DECODE_CHUNK_CHARS):
+        chunk = pending + encoded[start:start + DECODE_CHUNK_CHARS].translate(_WHITESPACE)
+        # Decode whole 4-character groups only; carry the remainder forward
+        cut = len(chunk) - len(chunk) % 4
+        pending = chunk[cut:]
+        written += f.write(base64.b64decode(chunk[:cut]))
+    if pending:
+        written += f.write(base64.b64decode(pending + "=" * (-len(pending) % 4)))
+    return written
+
+async def validate_and_repair(llm_handler, brief, checks, attachments, round_num, files):
+    """Validate generated files, regenerate the failures once and re-validate
+    
+    Returns ``(files, clean)``; ``clean`` is False if anything still fails
+    or validation itself broke. Never raises.
+    """
+    files = dict(files)
+    try:
+        print("🔎 Validating generated files...")
+        problems = await validate_files(files, checks)
+        if not problems:
+            print("  ✅ All files passed validation")
+            return files, True
+        for file_path, issues in problems.items():
+            print(f"  ⚠️ {file_path}: {'; '.join(issues)}")
+        
+        repaired = await llm_handler.repair_files(brief, checks, attachments, round_num, files, problems)
+        if not repaired:
+            return files, False
+        files.update(repaired)
+        print(f"  🔧 Regenerated {len(repaired)} file(s)")
+        
+        remaining = await validate_files(files, checks)
+        for file_path, issues in remaining.items():
+            print(f"  ⚠️ Still failing, publishing anyway: {file_path}: {'; '.join(issues)}")
+        return files, not remaining
+    except Exception as e:
+        print(f"  ⚠️ Validation stage failed, publishing unvalidated files: {e}")
+        return files, False
+
+async def process_task_background(data, github_mgr=None, llm_handler=None, http_client=None,
+                                  outbox=None, attachment_store=None):
+    """Background task processor
+    
+    Pass the long-lived clients from create_clients() to avoid rebuilding them
+    per task. Blocking PyGithub calls run in threads so one event loop can carry
+    many tasks. Returns the notification payload, or None if the task failed.
+    """
+    workspace = None
     try:
         print(f"\n{'='*60}")
         print(f"🚀 Processing Task: {data.get('task')}")
@@ -66,54 +153,102 @@ def process_task_background(data):
         attachments = data.get("attachments", [])
         evaluation_url = data.get("evaluation_url")
         
-        # Decode attachments
-        saved_attachments = decode_attachments(attachments)
+        # Decode attachments into a private workspace for this run
+        attachment_store = attachment_store or AttachmentStore()
+        workspace = attachment_store.create_workspace(f"{task_name}-r{round_num}")
+        saved_attachments = await asyncio.to_thread(
+            decode_attachments, attachments, attachment_store, workspace
+        )
         
-        # Initialize managers
-        github_mgr = GitHubManager(GITHUB_TOKEN, GITHUB_USERNAME)
-        llm_handler = LLMHandler(GEMINI_API_KEY)
+        # Initialize managers unless shared ones were provided
+        github_mgr = github_mgr or GitHubManager(GITHUB_TOKEN, GITHUB_USERNAME, http_client=http_client)
+        llm_handler = llm_handler or LLMHandler(GEMINI_API_KEY)
         
         # Create or get repository
-        repo = github_mgr.create_repository(task_name, f"Task: {task_name}")
+        repo = await asyncio.to_thread(github_mgr.create_repository, task_name, f"Task: {task_name}")
+        
+        # Start the publish now so blobs upload while the model is still writing
+        publisher = None
+        try:
+            publisher = await asyncio.to_thread(github_mgr.start_publish, repo)
+        except Exception as e:
+            print(f"  ⚠️ Could not start publishing early: {e}")
+        
+        # On revision rounds, read what's deployed so the model can patch it
+        existing_files = {}
+        if round_num > 1 and publisher:
+            existing_files = await asyncio.to_thread(publisher.read_text_files)
+            existing_files.pop("LICENSE", None)
+            # This round's attachments replace any deployed copies of them
+            for att in saved_attachments:
+                existing_files.pop(att["name"], None)
+        
+        # Catch broken files locally rather than after a deploy and evaluation;
+        # runs inside generation so only validated results are cached
+        async def finalize(files):
+            return await validate_and_repair(llm_handler, brief, checks, saved_attachments, round_num, files)
         
         # Generate files using LLM
-        print("🤖 Generating files with LLM...")
-        generated_files = llm_handler.generate_files(
-            brief=brief,
-            checks=checks,
-            attachments=saved_attachments,
-            round_num=round_num
-        )
+        deleted_files = []
+        if existing_files:
+            print("🤖 Revising deployed files with LLM...")
+            generated_files, deleted_files = await llm_handler.revise_files(
+                brief=brief,
+                checks=checks,
+                attachments=saved_attachments,
+                round_num=round_num,
+                existing_files=existing_files,
+                on_file=publisher.add,
+                finalize=finalize
+            )
+        else:
+            print("🤖 Generating files with LLM...")
+            generated_files = await llm_handler.generate_files(
+                brief=brief,
+                checks=checks,
+                attachments=saved_attachments,
+                round_num=round_num,
+                bypass_cache=bool(data.get("bypass_cache")),
+                on_file=publisher.add if publisher else None,
+                finalize=finalize
+            )
         
-        # Commit all files to GitHub
-        print("📤 Committing files to GitHub...")
-        for file_path, content in generated_files.items():
-            github_mgr.commit_file(repo, file_path, content, f"Add {file_path}")
+        # Collect generated files, attachments and LICENSE into one tree
+        tree_files = dict(generated_files)
         
-        # Commit attachments (skip if already processed by specialized handler)
-        processed_files = set(generated_files.keys())
+        # Add attachments (skip if already processed by specialized handler)
         for att in saved_attachments:
-            if att["name"] not in processed_files:
-                github_mgr.commit_binary_file(
-                    repo, 
-                    att["name"], 
-                    att["data"], 
-                    f"Add attachment {att['name']}"
-                )
+            if att["name"] not in tree_files:
+                tree_files[att["name"]] = Path(att["path"])
             else:
                 print(f"  ⏭️  Skipped {att['name']} (already processed)")
         
         # Add MIT LICENSE
-        license_text = github_mgr.generate_mit_license()
-        github_mgr.commit_file(repo, "LICENSE", license_text, "Add MIT LICENSE")
+        tree_files["LICENSE"] = github_mgr.generate_mit_license()
+        
+        # Publish everything as a single commit
+        print(f"📤 Publishing {len(tree_files)} files to GitHub...")
+        try:
+            if publisher is None:
+                publisher = await asyncio.to_thread(github_mgr.start_publish, repo)
+            await asyncio.to_thread(publisher.add_all, tree_files)
+            for file_path in deleted_files:
+                if file_path not in tree_files:
+                    publisher.delete(file_path)
+            # Streamed files the final result dropped (e.g. on fallback) are left out
+            commit_sha = await asyncio.to_thread(
+                publisher.commit, f"Round {round_num}: {task_name}", tree_files.keys()
+            )
+        except Exception as e:
+            # Fail the task so a resend requeues it; the old head isn't this round's deploy
+            print(f"  ❌ Failed to publish files: {e}")
+            if publisher:
+                publisher.close()
+            return None
         
         # Enable GitHub Pages
         print("🌐 Enabling GitHub Pages...")
-        github_mgr.enable_pages(task_name)
-        
-        # Get commit SHA
-        commits = list(repo.get_commits())
-        commit_sha = commits[0].sha if commits else None
+        await github_mgr.enable_pages(task_name)
         
         # Prepare notification payload
         pages_url = f"https://{GITHUB_USERNAME}.github.io/{task_name}/"
@@ -127,19 +262,24 @@ def process_task_background(data):
             "pages_url": pages_url
         }
         
-        # Wait a bit for Pages to deploy
+        # Wait until Pages has built our commit
         print("⏳ Waiting for GitHub Pages deployment...")
-        time.sleep(10)
+        if commit_sha:
+            await github_mgr.wait_for_pages(repo, commit_sha)
         
-        # Notify evaluation server
-        print("📨 Notifying evaluation server...")
-        notify_evaluation(evaluation_url, payload)
+        # Hand the notification to the outbox; the dispatcher delivers it
+        await asyncio.to_thread(notify_evaluation, evaluation_url, payload, outbox)
         
         print(f"\n✅ Task {task_name} completed successfully!")
         print(f"📁 Repo: {repo.html_url}")
         print(f"🌐 Pages: {pages_url}\n")
+        return payload
         
     except Exception as e:
         print(f"\n❌ Error processing task: {e}")
         import traceback
         traceback.print_exc()
+    
+    finally:
+        if workspace is not None:
+            await asyncio.to_thread(attachment_store.release_workspace, workspace)
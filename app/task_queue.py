@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+import multiprocessing
+from contextlib import closing
+from pathlib import Path
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "/tmp/tds-data"))
+QUEUE_DB = DATA_DIR / "tasks.db"
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "2"))
+TASK_CONCURRENCY = int(os.getenv("TASK_CONCURRENCY", "20"))
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0
+# Running tasks hold a lease their worker renews; an expired lease means the worker died
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "120"))
+HEARTBEAT_INTERVAL = TASK_LEASE_SECONDS / 4
+SUPERVISE_INTERVAL = 5.0
+# Never persisted: only needed to authenticate the request
+STRIPPED_FIELDS = ("secret",)
+
+class TaskQueue:
+    """Persistent task queue backed by SQLite in WAL mode
+
+    Safe to share between the API process and worker processes: every
+    method opens its own short-lived connection.
+    """
+
+    def __init__(self, db_path=QUEUE_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, id)")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            if "dedupe_key" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN dedupe_key TEXT")
+            if "lease_until" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN lease_until REAL")
+            if "claim_token" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN claim_token TEXT")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_dedupe ON tasks (dedupe_key)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue_once(self, data, dedupe_key):
+        """Persist a task unless one with the same key exists; returns (task_id, created)"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO tasks (payload, dedupe_key, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (_stored_payload(data), dedupe_key, now, now)
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            row = conn.execute("SELECT id FROM tasks WHERE dedupe_key = ?", (dedupe_key,)).fetchone()
+            return row["id"], False
+
+    def retry(self, task_id, data):
+        """Put a failed task back in the queue with the resent request's payload
+
+        Finished tasks don't keep their payload, so the resend supplies it.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'queued', payload = ?, attempts = 0, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'failed'",
+                (_stored_payload(data), time.time(), task_id)
+            )
+
+    def claim(self):
+        """Atomically take the oldest queued task; returns (task_id, data, token) or None
+
+        The token identifies this claim: renewing and finishing the task only
+        succeed while it is still the task's current claim.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload FROM tasks WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, lease_until = ?, claim_token = ?, "
+                "updated_at = ? WHERE id = ?",
+                (now + TASK_LEASE_SECONDS, token, now, row["id"])
+            )
+            conn.execute("COMMIT")
+            return row["id"], json.loads(row["payload"]), token
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, task_id, token):
+        """Extend a running task's lease; returns False if the claim was lost"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND status = 'running' AND claim_token = ?",
+                (time.time() + TASK_LEASE_SECONDS, task_id, token)
+            )
+            return cursor.rowcount > 0
+
+    def complete(self, task_id, token, result=None):
+        return self._finish(task_id, token, "done", result=json.dumps(result))
+
+    def fail(self, task_id, token, error):
+        return self._finish(task_id, token, "failed", error=str(error))
+
+    def _finish(self, task_id, token, status, result=None, error=None):
+        """Record the outcome if ``token`` still holds the task; returns whether it did"""
+        # The payload (attachments can be ~100 MB of base64) isn't needed once finished
+        with closing(self._connect()) as conn:
+            finished = conn.execute(
+                "UPDATE tasks SET status = ?, payload = '{}', result = ?, error = ?, lease_until = NULL, "
+                "claim_token = NULL, updated_at = ? WHERE id = ? AND status = 'running' AND claim_token = ?",
+                (status, result, error, time.time(), task_id, token)
+            ).rowcount > 0
+        if not finished:
+            print(f"⚠️ Task #{task_id} was requeued after its lease expired; dropping this run's outcome")
+        return finished
+
+    def recover(self):
+        """Requeue all tasks left running by a previous process; run at startup
+
+        Also drops payloads that finished tasks stored before they were pruned.
+        """
+        requeued = self._requeue_running("1")
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE tasks SET payload = '{}' WHERE status IN ('done', 'failed') AND payload != '{}'")
+        if requeued:
+            print(f"♻️ Resuming {requeued} interrupted task(s)")
+
+    def requeue_expired(self):
+        """Requeue running tasks whose worker stopped renewing the lease"""
+        requeued = self._requeue_running("lease_until IS NULL OR lease_until < ?", time.time())
+        if requeued:
+            print(f"♻️ Requeued {requeued} task(s) from dead workers")
+        return requeued
+
+    def _requeue_running(self, condition, *params):
+        """Requeue matching running tasks; give up on those at MAX_ATTEMPTS"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', payload = '{}', error = 'too many attempts', "
+                f"lease_until = NULL, claim_token = NULL, updated_at = ? WHERE status = 'running' AND attempts >= ? AND ({condition})",
+                (now, MAX_ATTEMPTS, *params)
+            )
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'queued', lease_until = NULL, claim_token = NULL, updated_at = ? "
+                f"WHERE status = 'running' AND ({condition})",
+                (now, *params)
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, task_id):
+        """Return a task's status record, or None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, status, attempts, result, error, created_at, updated_at FROM tasks WHERE id = ?",
+                (task_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
+
+def _stored_payload(data):
+    return json.dumps({key: value for key, value in data.items() if key not in STRIPPED_FIELDS})
+
+class LeaseKeeper:
+    """Renews the leases of a worker's running tasks on its own thread
+
+    Kept off the event loop and the default executor, so busy tasks can't
+    delay a renewal past TASK_LEASE_SECONDS.
+    """
+
+    def __init__(self, queue, interval=HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.interval = interval
+        self._claims = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def hold(self, task_id, token):
+        with self._lock:
+            self._claims[task_id] = token
+
+    def release(self, task_id):
+        with self._lock:
+            self._claims.pop(task_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                claims = list(self._claims.items())
+            for task_id, token in claims:
+                try:
+                    if not self.queue.heartbeat(task_id, token):
+                        print(f"⚠️ Lost the lease on task #{task_id}")
+                        self.release(task_id)
+                except Exception as e:
+                    print(f"⚠️ Heartbeat for task #{task_id} failed: {e}")
+
+def worker_main(db_path, stop_event):
+    """Worker process entry point: run the async drain loop until stopped"""
+    try:
+        asyncio.run(_drain(TaskQueue(db_path), stop_event))
+    except KeyboardInterrupt:
+        pass
+
+async def _drain(queue, stop_event):
+    """Keep up to TASK_CONCURRENCY tasks in flight on this worker's event loop"""
+    from app.task_processor import create_clients
+
+    clients = create_clients()
+    name = multiprocessing.current_process().name
+    slots = asyncio.Semaphore(TASK_CONCURRENCY)
+    running = set()
+    leases = LeaseKeeper(queue)
+    leases.start()
+    print(f"👷 {name} started")
+
+    try:
+        while not stop_event.is_set():
+            await slots.acquire()
+            claimed = await asyncio.to_thread(queue.claim)
+            if claimed is None:
+                slots.release()
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            task = asyncio.create_task(_run_task(queue, claimed, clients, leases, name))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+        # Let in-flight tasks finish before exiting
+        await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        leases.stop()
+        await clients["http_client"].aclose()
+
+async def _run_task(queue, claimed, clients, leases, name):
+    from app.task_processor import process_task_background
+
+    task_id, data, token = claimed
+    print(f"👷 {name} picked task #{task_id}")
+    leases.hold(task_id, token)
+    try:
+        result = await process_task_background(data, **clients)
+        if result is None:
+            await asyncio.to_thread(queue.fail, task_id, token, "processing failed")
+        else:
+            await asyncio.to_thread(queue.complete, task_id, token, result)
+    except Exception as e:
+        await asyncio.to_thread(queue.fail, task_id, token, e)
+    finally:
+        leases.release(task_id)
+
+def start_workers(db_path=QUEUE_DB, count=TASK_WORKERS):
+    """Spawn the worker pool; returns (processes, stop_event)"""
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    processes = [_spawn_worker(db_path, stop_event, f"task-worker-{i + 1}") for i in range(max(1, count))]
+    return processes, stop_event
+
+def _spawn_worker(db_path, stop_event, name):
+    process = multiprocessing.get_context("spawn").Process(
+        target=worker_main,
+        args=(str(db_path), stop_event),
+        name=name,
+        daemon=True
+    )
+    process.start()
+    return process
+
+def respawn_dead_workers(processes, stop_event, db_path=QUEUE_DB):
+    """Replace worker processes that died (e.g. OOM-killed) in place"""
+    for i, process in enumerate(processes):
+        if not process.is_alive() and not stop_event.is_set():
+            print(f"💀 {process.name} exited (code {process.exitcode}), restarting it")
+            processes[i] = _spawn_worker(db_path, stop_event, process.name)
+
+async def supervise_workers(queue, processes, stop_event, stop):
+    """Until ``stop`` is set: respawn dead workers and requeue their orphaned tasks"""
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(respawn_dead_workers, processes, stop_event, queue.db_path)
+            await asyncio.to_thread(queue.requeue_expired)
+        except Exception as e:
+            print(f"❌ Worker supervision failed: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), SUPERVISE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+def stop_workers(processes, stop_event, timeout=30.0):
+    """Ask workers to finish their current task and exit"""
+    stop_event.set()
+    for process in processes:
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
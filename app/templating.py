@@ -0,0 +1,86 @@
+import re
+import html
+from functools import lru_cache
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+RENDER_CACHE_SIZE = 256
+# $name or ${name}; $$ is a literal dollar sign
+_PLACEHOLDER = re.compile(r"\$(?:(\$)|(\w+)|\{(\w+)\})")
+
+class Markup(str):
+    """Text that is already safe HTML and is inserted without escaping"""
+
+def escape(value):
+    if isinstance(value, Markup):
+        return value
+    return Markup(html.escape(str(value)))
+
+def html_list_items(items):
+    """Escaped ``<li>`` elements for a template's list placeholder"""
+    return Markup("".join(f"<li>{escape(item)}</li>" for item in items))
+
+class Template:
+    """A template compiled once into literal and placeholder segments
+
+    Placeholders use ``$name``/``${name}`` (``$$`` for a literal ``$``), so CSS
+    and JS braces need no escaping. HTML templates escape every value that
+    isn't ``Markup``.
+    """
+
+    def __init__(self, name, source, autoescape=False):
+        self.name = name
+        self.autoescape = autoescape
+        self.literals = []
+        self.names = []
+        pos = 0
+        literal = ""
+        for match in _PLACEHOLDER.finditer(source):
+            literal += source[pos:match.start()]
+            pos = match.end()
+            if match.group(1):
+                literal += "$"
+                continue
+            self.literals.append(literal)
+            self.names.append(match.group(2) or match.group(3))
+            literal = ""
+        self.literals.append(literal + source[pos:])
+
+    def render(self, **context):
+        missing = [name for name in self.names if name not in context]
+        if missing:
+            raise KeyError(f"template {self.name} needs {', '.join(missing)}")
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            value = context[name]
+            parts.append(escape(value) if self.autoescape else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+def load_templates(directory=TEMPLATE_DIR):
+    """Read and compile every template in a directory, keyed by file name"""
+    templates = {}
+    for path in sorted(Path(directory).iterdir()):
+        if path.is_file():
+            source = path.read_text(encoding="utf-8")
+            templates[path.name] = Template(path.name, source, autoescape=path.suffix in (".html", ".htm"))
+    return templates
+
+# Compiled once per process, at import
+TEMPLATES = load_templates()
+
+def render(name, **context):
+    """Render a template; results are cached on the template name and inputs
+
+    List values are accepted and treated as tuples for the cache key. The
+    value's type is part of the key so ``Markup`` and plain text never share
+    an entry.
+    """
+    key = tuple(sorted(
+        (k, type(v), tuple(v) if isinstance(v, list) else v) for k, v in context.items()
+    ))
+    return _render_cached(name, key)
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_cached(name, key):
+    return TEMPLATES[name].render(**{k: v for k, _, v in key})
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import asyncio
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:  # optional: falls back to a structural check
+    yaml = None
+
+VALIDATOR_WORKERS = int(os.getenv("VALIDATOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+VALIDATE_EXTENSIONS = ('.html', '.htm', '.json', '.svg', '.yml', '.yaml')
+
+# Element IDs the checks expect: getElementById("x") and #x inside querySelector("...")
+_GET_BY_ID = re.compile(r"getElementById\(\s*(['\"`])([^'\"`]+)\1")
+_QUERY_SELECTOR = re.compile(r"querySelector(?:All)?\(\s*(['\"`])(.+?)\1")
+_SELECTOR_ID = re.compile(r"#([A-Za-z_][\w-]*)")
+# HTML void elements never get a closing tag
+_VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr"
+}
+
+_executor = None
+
+def required_ids(checks):
+    """Element IDs referenced by the JS-style check strings"""
+    ids = set()
+    for check in checks or []:
+        check = str(check)
+        ids.update(match.group(2) for match in _GET_BY_ID.finditer(check))
+        for match in _QUERY_SELECTOR.finditer(check):
+            ids.update(_SELECTOR_ID.findall(match.group(2)))
+    return ids
+
+class _IdCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.ids = set()
+        self.open_tags = []
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if name == "id" and value:
+                self.ids.add(value)
+        if tag not in _VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        for name, value in attrs:
+            if name == "id" and value:
+                self.ids.add(value)
+
+    def handle_endtag(self, tag):
+        if tag in self.open_tags:
+            # Browsers close skipped elements implicitly (e.g. </li>), so only pop
+            while self.open_tags.pop() != tag:
+                pass
+
+def check_html(content):
+    """Returns (problems, ids defined in the document)"""
+    parser = _IdCollector()
+    try:
+        parser.feed(content)
+        parser.close()
+    except Exception as e:
+        return [f"HTML could not be parsed: {e}"], set()
+    problems = []
+    for tag in ("script", "style"):
+        if tag in parser.open_tags:
+            problems.append(f"unclosed <{tag}> element (the file looks truncated)")
+    return problems, parser.ids
+
+def check_json(content):
+    try:
+        json.loads(content)
+    except json.JSONDecodeError as e:
+        return [f"invalid JSON: {e}"]
+    return []
+
+def check_svg(content):
+    try:
+        root = ET.fromstring(content.strip())
+    except ET.ParseError as e:
+        return [f"invalid SVG/XML: {e}"]
+    if not root.tag.endswith("svg"):
+        return [f"root element is <{root.tag}>, expected <svg>"]
+    return []
+
+def check_workflow(content):
+    """Lint a GitHub Actions workflow: valid YAML with triggers and runnable jobs"""
+    if "\t" in content:
+        return ["workflow YAML contains tab characters"]
+    if yaml is None:
+        problems = []
+        for key in ("on", "jobs"):
+            if not re.search(rf"^['\"]?{key}['\"]?\s*:", content, re.MULTILINE):
+                problems.append(f"workflow has no top-level '{key}:'")
+        if not re.search(r"^\s+runs-on\s*:", content, re.MULTILINE):
+            problems.append("workflow job has no 'runs-on'")
+        return problems
+
+    try:
+        data = yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        return [f"invalid YAML: {e}"]
+    if not isinstance(data, dict):
+        return ["workflow is not a YAML mapping"]
+    problems = []
+    # YAML 1.1 reads a bare `on` key as boolean True
+    if "on" not in data and True not in data:
+        problems.append("workflow has no 'on' trigger")
+    jobs = data.get("jobs")
+    if not isinstance(jobs, dict) or not jobs:
+        problems.append("workflow has no jobs")
+        return problems
+    for job_name, job in jobs.items():
+        if not isinstance(job, dict):
+            problems.append(f"job '{job_name}' is not a mapping")
+        elif "uses" not in job and ("runs-on" not in job or not isinstance(job.get("steps"), list)):
+            problems.append(f"job '{job_name}' needs 'runs-on' and a 'steps' list")
+    return problems
+
+def validate_file(file_path, content):
+    """Validate one file; returns (path, problems, ids defined if HTML)"""
+    name = file_path.lower()
+    ids = set()
+    if name.endswith(('.html', '.htm')):
+        problems, ids = check_html(content)
+    elif name.endswith('.json'):
+        problems = check_json(content)
+    elif name.endswith('.svg'):
+        problems = check_svg(content)
+    elif name.startswith('.github/workflows/') and name.endswith(('.yml', '.yaml')):
+        problems = check_workflow(content)
+    else:
+        problems = []
+    return file_path, problems, ids
+
+def _created_by_scripts(files, element_id):
+    """Whether scripts assign this ID: ``.id = "x"``, ``setAttribute("id", "x")`` or
+    ``id="x"`` inside a markup string. Code that only reads the ID doesn't count.
+    """
+    quoted = re.escape(element_id)
+    created = re.compile(
+        rf"""\.id\s*=\s*(['"`]){quoted}\1"""
+        rf"""|setAttribute\(\s*(['"`])id\2\s*,\s*(['"`]){quoted}\3"""
+        rf"""|\bid\s*=\s*\\?['"]{quoted}\\?['"]"""
+    )
+    for file_path, content in files.items():
+        if isinstance(content, str) and file_path.lower().endswith(('.html', '.htm', '.js', '.mjs')):
+            if created.search(content):
+                return True
+    return False
+
+def _get_executor():
+    """Process pool for parsing; threads inside daemonic task workers, which can't fork children"""
+    global _executor
+    if _executor is None:
+        if multiprocessing.current_process().daemon:
+            _executor = ThreadPoolExecutor(max_workers=VALIDATOR_WORKERS, thread_name_prefix="validator")
+        else:
+            _executor = ProcessPoolExecutor(max_workers=VALIDATOR_WORKERS)
+    return _executor
+
+async def validate_files(files, checks):
+    """Validate generated files in parallel; returns {path: [problems]} for failures
+
+    HTML, JSON, SVG and workflow YAML are checked. Element IDs named in the
+    checks must be defined by some HTML file; missing ones are reported
+    against index.html (or the first HTML file).
+    """
+    jobs = []
+    for file_path, content in files.items():
+        if not file_path.lower().endswith(VALIDATE_EXTENSIONS):
+            continue
+        if isinstance(content, Path):
+            content = content.read_text(encoding="utf-8", errors="replace")
+        elif isinstance(content, bytes):
+            content = content.decode("utf-8", errors="replace")
+        if isinstance(content, str):
+            jobs.append((file_path, content))
+    if not jobs:
+        return {}
+
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    outcomes = await asyncio.gather(*(
+        loop.run_in_executor(executor, validate_file, file_path, content)
+        for file_path, content in jobs
+    ), return_exceptions=True)
+    
+    # A validator crash says nothing about the file, so it doesn't fail it
+    results = []
+    for (file_path, _), outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"  ⚠️ Could not validate {file_path}: {outcome}")
+        else:
+            results.append(outcome)
+
+    problems = {file_path: found for file_path, found, _ in results if found}
+    html_files = [file_path for file_path, _, _ in results if file_path.lower().endswith(('.html', '.htm'))]
+    defined = set().union(*(ids for _, _, ids in results))
+    missing = sorted(required_ids(checks) - defined)
+    # IDs that scripts assign at runtime (el.id = "x") can't be judged statically
+    scripted = [element_id for element_id in missing if _created_by_scripts(files, element_id)]
+    if scripted:
+        print(f"  ℹ️ IDs not in static HTML but created by scripts: {', '.join(scripted)}")
+        missing = [element_id for element_id in missing if element_id not in scripted]
+    if missing and html_files:
+        target = "index.html" if "index.html" in html_files else html_files[0]
+        problems.setdefault(target, []).append(
+            "missing element IDs required by the checks: " + ", ".join(f"#{i}" for i in missing)
+        )
+    return problems
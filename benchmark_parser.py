@@ -0,0 +1,70 @@
+"""
+Benchmark for LLM response parsing on large (multi-hundred-KB) outputs
+Compares the old regex-based extraction with the single-pass scanner
+"""
+import re
+import json
+import time
+from app.json_stream import extract_json_object
+
+def build_response(n_files, file_size):
+    """Build a fenced model response with nested braces in the file contents"""
+    body = "function render(data) { return { items: data.map(x => ({ id: x })) }; }\n"
+    files = {
+        f"src/module_{i}.js": (body * (file_size // len(body) + 1))[:file_size]
+        for i in range(n_files)
+    }
+    files["index.html"] = "<html><body><script>window.cfg = { a: { b: 1 } };</script></body></html>"
+    text = "Here is the app you asked for:\n```json\n" + json.dumps({"files": files}, indent=2) + "\n```\n"
+    return text, files
+
+def regex_extract(response_text):
+    """The previous _parse_llm_response strategy"""
+    match = re.search(r'```json\s*(\{.*?\})\s*```', response_text, re.DOTALL)
+    candidate = match.group(1) if match else response_text
+    try:
+        return json.loads(candidate).get("files")
+    except json.JSONDecodeError:
+        match = re.search(r'\{.*"files".*\}', response_text, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group(0)).get("files")
+            except json.JSONDecodeError:
+                pass
+    return None
+
+def scanner_extract(response_text):
+    data = extract_json_object(response_text)
+    return data.get("files") if data else None
+
+def time_it(func, text, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    print("\n" + "="*60)
+    print("📊 LLM RESPONSE PARSING BENCHMARK")
+    print("="*60)
+
+    for n_files, file_size in [(10, 10_000), (40, 10_000), (20, 40_000)]:
+        text, files = build_response(n_files, file_size)
+        truncated = text[:int(len(text) * 0.9)]
+        print(f"\n📄 {n_files} files, {len(text) // 1024} KB response")
+
+        for label, func in [("regex", regex_extract), ("scanner", scanner_extract)]:
+            elapsed, result = time_it(func, text)
+            ok = "✅" if result == files else "❌"
+            print(f"  {label:8} full:      {elapsed * 1000:8.2f} ms {ok}")
+
+            elapsed, result = time_it(func, truncated)
+            recovered = len(result) if result else 0
+            print(f"  {label:8} truncated: {elapsed * 1000:8.2f} ms ({recovered} files recovered)")
+    print()
+
+if __name__ == "__main__":
+    main()